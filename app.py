@@ -1,6 +1,12 @@
 # Import required libraries
+import collections
 import copy
+import hashlib
+import json
+import logging
+import os
 import pathlib
+import threading
 
 import numpy as np
 import pandas as pd
@@ -9,15 +15,37 @@ import dash
 import dash_core_components as dcc
 import dash_html_components as html
 import dash_table
+import flask
+import utils.acwr as acwr
+import utils.caching as caching
 import utils.controls as c
+import utils.downsample as downsample
 import utils.etl as etl
-from dash.dependencies import Input, Output
+import utils.live as live
+import utils.metrics as metrics
+import utils.serialize as serialize
+import utils.store as store
+import utils.table as table
+import utils.totals as totals
+from dash.dependencies import ClientsideFunction, Input, Output, State
+from dash.exceptions import PreventUpdate
+
+logger = logging.getLogger(__name__)
 
 # get relative data folder
 PATH = pathlib.Path(__file__).parent
-DATA_PATH = PATH.joinpath("data").resolve()
+DATA_PATH = pathlib.Path(
+    os.environ.get("ASRUC_DATA_PATH", PATH.joinpath("data"))).resolve()
+
+# Long time series are reduced to what their graph can show: "lttb", "minmax"
+# or "none"
+DOWNSAMPLING = os.environ.get("ASRUC_DOWNSAMPLING", "lttb")
+if DOWNSAMPLING == "none":
+    DOWNSAMPLING = None
 
+# Compressed with Flask-Compress
 app = dash.Dash(__name__,
+                compress=True,
                 meta_tags=[{
                     "name": "viewport",
                     "content": "width=device-width"
@@ -36,27 +64,397 @@ population_options = [{
     "value": str(population)
 } for population in c.POPULATION]
 
+load_options = [{
+    "label": str(c.LOADS[load]),
+    "value": str(load)
+} for load in c.LOADS]
+
+totals_options = [{
+    "label": str(c.TOTALS[total]),
+    "value": str(total)
+} for total in c.TOTALS]
+
 dpzv_options = [{
     "label": str(c.DPZV[dpzv]),
     "value": str(dpzv)
 } for dpzv in c.DPZV]
 
+table_columns = [{
+    "name": name,
+    "id": col
+} for col, name in zip(c.COLNAMES, c.PRETTY_COLNAMES)]
+
 # Load data
-rpe, seances = etl.get_datasets("./data", ["RPE", "Seances"])
-postes = pd.read_excel(DATA_PATH.joinpath("postes.xlsx")).iloc[:, [1, -1]]
-
-rpe.Date = pd.to_datetime(rpe.Date)
-rpe = rpe.merge(postes,
-                on="Nom",
-                left_index=False,
-                right_index=False,
-                how="left")
-seances.Date = pd.to_datetime(seances.Date)
-seances = seances.merge(postes,
-                        on="Nom",
-                        left_index=False,
-                        right_index=False,
-                        how="left")
+DATASETS = ["RPE", "Seances"]
+TEAMS = etl.teams(DATA_PATH, DATASETS)
+
+team_options = [{"label": team, "value": team} for team in TEAMS]
+
+# Teams loaded with each data version, e.g. ASRUC_PRELOAD_TEAMS=ASRUC,Espoirs,
+# the team shown first by default. The others are loaded on their first
+# request, and then kept up to date
+PRELOAD_TEAMS = [
+    team for team in os.environ.get("ASRUC_PRELOAD_TEAMS", next(
+        iter(TEAMS), "")).split(",") if team in TEAMS
+]
+
+# Months of history loaded for each team, back from its last month with data,
+# 0 for the whole archive. The totals of the date range cover every month.
+HISTORY_MONTHS = int(os.environ.get("ASRUC_HISTORY_MONTHS", 3))
+
+# Columns of each total, summed over the date range, or averaged
+TOTALS_COLUMNS = dict(DPZV=list(c.DPZV),
+                      TZFC=list(c.TZFC),
+                      Sprints=["Sprints"],
+                      Power=["Power"])
+AVERAGED_TOTALS = ["Power"]
+SUMMED_COLUMNS = [col for cols in TOTALS_COLUMNS.values() for col in cols]
+
+# Datasets of one version, replaced as a whole when new files come in or a
+# team is loaded. Every field but version and files is keyed by team, for the
+# teams loaded
+Snapshot = collections.namedtuple("Snapshot", [
+    "version", "files", "rpe", "seances", "table", "positions", "workload",
+    "totals"
+])
+
+# Workload ratios, kept between versions to only compute the new days
+workloads = {(team, load): acwr.Workload() for team in TEAMS for load in c.LOADS}
+
+# Daily sums of the totals over every month, updated with the partitions of
+# the ingest cache rewritten
+daily_sums = {
+    team: totals.DailySums(folder, "Seances", SUMMED_COLUMNS)
+    for team, folder in TEAMS.items()
+}
+
+
+def load_team(team, version):
+    """Datasets of one team, read from the months of history kept
+    
+    Arguments:
+        team {str} -- team name, see etl.teams
+        version {str} -- data version, see data_version
+    
+    Returns:
+        [tuple] -- rpe, seances, table, positions, workload and totals of
+                   the team
+    """
+    folder = TEAMS[team]
+    rpe, seances = etl.get_datasets(
+        folder,
+        DATASETS,
+        months=HISTORY_MONTHS or None,
+        on_update=dict(Seances=daily_sums[team].update))
+    postes = pd.read_excel(folder.joinpath("postes.xlsx")).iloc[:, [1, -1]]
+
+    rpe.Date = pd.to_datetime(rpe.Date)
+    rpe = rpe.merge(postes,
+                    on="Nom",
+                    left_index=False,
+                    right_index=False,
+                    how="left")
+    seances.Date = pd.to_datetime(seances.Date)
+    seances = seances.merge(postes,
+                            on="Nom",
+                            left_index=False,
+                            right_index=False,
+                            how="left")
+
+    rpe = etl.Dataset(etl.compact(rpe), "{}/RPE".format(team), version)
+    seances = etl.Dataset(etl.compact(seances), "{}/Seances".format(team),
+                          version)
+
+    workload = {
+        load:
+            workloads[team, load].update(
+                acwr.daily_loads(rpe.frame, seances.frame, load))
+        for load in c.LOADS
+    }
+
+    # the date range reaches back over the whole history
+    positions = postes.set_index("Nom").Position
+    range_totals = daily_sums[team].totals(positions)
+
+    return (rpe, seances, table.TableView(seances, c.COLNAMES), positions,
+            workload, range_totals)
+
+
+def data_version(files):
+    """Version of the data, derived from the files loaded and the settings
+    they are read with, so that every process and restart agrees on it
+    
+    Arguments:
+        files {frozenset} -- files loaded, see etl.scan
+    
+    Returns:
+        [str] -- version
+    """
+    key = json.dumps([etl.INGEST_VERSION, HISTORY_MONTHS,
+                      sorted(files)]).encode()
+    return hashlib.sha1(key).hexdigest()[:16]
+
+
+def with_team(current, team):
+    """Snapshot with one more team, loaded for its version"""
+    fields = zip(Snapshot._fields[2:], load_team(team, current.version))
+    return current._replace(
+        **{
+            field: dict(getattr(current, field), **{team: value})
+            for field, value in fields
+        })
+
+
+def load_snapshot(version=None, teams=None):
+    """Datasets of the current files, for some teams
+    
+    Keyword Arguments:
+        version {str} -- data version (default: {None}, see data_version)
+        teams {list} -- teams loaded, the ones other than PRELOAD_TEAMS are
+                        skipped when they fail to load (default: {None},
+                        PRELOAD_TEAMS)
+    
+    Returns:
+        [Snapshot] -- datasets
+    """
+    files = etl.scan(DATA_PATH, DATASETS)
+    if version is None:
+        version = data_version(files)
+    current = Snapshot(version, files, *({} for _ in Snapshot._fields[2:]))
+    for team in PRELOAD_TEAMS if teams is None else teams:
+        try:
+            current = with_team(current, team)
+        except Exception:
+            if team in PRELOAD_TEAMS:
+                raise
+            logger.exception("loading %s failed, waiting for new files", team)
+
+    return current
+
+
+# Loaded in the background by start, None until the first version is ready
+snapshot = None
+
+# Called after each version is loaded, see start
+on_reload = None
+
+# Held while a version or a team is loaded, one at a time. Forks wait for it,
+# so the gunicorn master never forks while its load thread holds a lock, and
+# a load can fork its ingest processes
+loads = threading.RLock()
+os.register_at_fork(before=loads.acquire,
+                    after_in_parent=loads.release,
+                    after_in_child=loads.release)
+
+# Teams asked for by a request, loaded in the background, see request_team
+requested = set()
+
+
+def reload():
+    """Ingest the new files and swap in the new datasets
+    
+    The teams loaded so far are loaded again. Callbacks read the snapshot
+    once, so they keep working on a consistent version while it is replaced.
+    """
+    global snapshot
+    with loads:
+        teams = PRELOAD_TEAMS + sorted(requested - set(PRELOAD_TEAMS))
+        snapshot = current = load_snapshot(teams=teams)
+        if on_reload is not None:
+            # built before the new workers are forked, see start
+            for team in current.rpe:
+                figure_store.rebuild(current.version, team)
+
+    if on_reload is None:
+        for team in current.rpe:
+            figure_store.refresh(current.version, team)
+    else:
+        on_reload()
+
+
+def _load_team(team):
+    global snapshot
+    with loads:
+        current = snapshot
+        if current is None or team in current.rpe:
+            return
+        try:
+            snapshot = current = with_team(current, team)
+        except Exception:
+            # loaded again with the next version
+            logger.exception("loading %s failed, waiting for new files", team)
+            return
+
+    figure_store.refresh(current.version, team)
+
+
+def request_team(team):
+    """Load a team in the background, on its first request"""
+    with loads:
+        if team in requested:
+            return
+        requested.add(team)
+    threading.Thread(target=_load_team,
+                     args=(team,),
+                     name="load-{}".format(team),
+                     daemon=True).start()
+
+
+def team_snapshot(team):
+    """The snapshot, once it holds a team
+    
+    Arguments:
+        team {str} -- team name
+    
+    Returns:
+        [Snapshot] -- datasets, None while the team loads, see request_team
+    """
+    current = snapshot
+    if current is None or team not in TEAMS:
+        return None
+    if team not in current.rpe:
+        request_team(team)
+        return None
+    return current
+
+
+# Reload when workbooks are added or modified, started with the data load
+WATCH_INTERVAL = float(os.environ.get("ASRUC_WATCH_INTERVAL", 30))
+watcher = etl.Watcher(DATA_PATH, DATASETS, reload, interval=WATCH_INTERVAL)
+
+# Pages poll at this interval until the team selected is loaded
+LOADING_INTERVAL = 2
+
+# Session in progress, tailed from the file the receivers write to, e.g.
+# ASRUC_LIVE_FEED=/var/lib/asruc/live.ndjson. The live graphs are hidden
+# without it
+LIVE_FEED = os.environ.get("ASRUC_LIVE_FEED")
+LIVE_INTERVAL = float(os.environ.get("ASRUC_LIVE_INTERVAL", 2))
+# Summed per player during the session
+LIVE_COLUMNS = list(c.TZFC) + ["Sprints"]
+feed = live.Feed(LIVE_FEED, LIVE_COLUMNS,
+                 interval=LIVE_INTERVAL) if LIVE_FEED else None
+
+
+def ready():
+    return snapshot is not None and all(
+        figure_store.version(team) is not None for team in PRELOAD_TEAMS)
+
+
+def _load():
+    files = etl.scan(DATA_PATH, DATASETS)
+    try:
+        reload()
+    except Exception:
+        # e.g. an unreadable workbook, loaded again once the files change
+        logger.exception("loading the data failed, waiting for new files")
+
+    watcher.known = files
+    watcher.start()
+
+
+def start(reloaded=None):
+    """Load the data in a background thread, then watch for changes
+    
+    The server answers meanwhile: /readyz fails and the graphs show a
+    loading figure until the first version is ready.
+    
+    Only PRELOAD_TEAMS are loaded, the other teams on their first request.
+    Under gunicorn, the master loads them once for every worker, see
+    gunicorn.conf.py. The outputs of each version are then built before
+    reloaded is called, for the master to replace the workers by ones forked
+    with them. The teams loaded on request are loaded by each worker.
+    
+    Keyword Arguments:
+        reloaded {function} -- called after each version is loaded, and its
+                               outputs built (default: {None})
+    """
+    global on_reload
+    on_reload = reloaded
+    threading.Thread(target=_load, name="initial-load", daemon=True).start()
+
+
+def start_feed():
+    """Tail the live feed, if any, in the process serving the requests"""
+    if feed is not None:
+        feed.start()
+
+
+# Subsets shared by all callbacks, one selector change filters each dataset once
+filter_cache = etl.FilterCache()
+
+# Outputs of every control combination, rebuilt in the background when the
+# data changes, and built for each team when it is loaded. The team is the
+# third argument of every precomputed callback
+figure_store = store.FigureStore(workers=int(
+    os.environ.get("ASRUC_AGGREGATION_WORKERS", 1)),
+                                 part=2)
+
+
+def clientside(output, inputs):
+    """Answer a precomputed callback in the browser
+    
+    The outputs of every combination of the team selected are pushed once
+    to aggregate_data, so other selector changes do not reach the server.
+    
+    Arguments:
+        output {Output} -- output, or list of outputs
+        inputs {list} -- inputs, in the order of the callback arguments
+    
+    Returns:
+        [function] -- decorator
+    """
+
+    def wrap(func):
+        app.clientside_callback(
+            ClientsideFunction("precomputed", func.__name__), output,
+            [Input("aggregate_data", "data")] + inputs)
+        return func
+
+    return wrap
+
+
+# Liveness and readiness probes, the server answers while the data loads
+@server.route("/healthz")
+def healthz():
+    return flask.jsonify(status="ok")
+
+
+@server.route("/readyz")
+def readyz():
+    return flask.jsonify(ready=ready(),
+                         version=None if snapshot is None else snapshot.version,
+                         figures=figure_store.status()), 200 if ready() else 503
+
+
+# Cache statistics
+@server.route("/cache")
+def cache_info():
+    return flask.jsonify(filter=filter_cache.info()._asdict(),
+                         figures=figure_store.status())
+
+
+# Callback latencies and cache statistics, in the Prometheus text format
+metrics.init_app(server)
+metrics.gauge(
+    "asruc_filter_cache", "Filter cache hits, misses and size", lambda: {
+        (("stat", k),): v for k, v in filter_cache.info()._asdict().items()
+    })
+metrics.gauge("asruc_figure_store_size", "Outputs in the figure store",
+              lambda: len(figure_store))
+metrics.gauge(
+    "asruc_figure_store_jobs", "Background rebuild jobs, by state", lambda: {
+        (("state", state),): figure_store.status()[state]
+        for state in ["queued", "running", "failed"]
+    })
+metrics.gauge(
+    "asruc_data_version", "Version of the datasets served, as a label",
+    lambda: {} if snapshot is None else {(("version", snapshot.version),): 1})
+
+# Layout and dependencies tagged for conditional page loads, assets cached by
+# browsers
+caching.init_app(server)
+serialize.init_app(server)
 
 # Create global chart template
 layout = dict(
@@ -71,10 +469,63 @@ layout = dict(
     title="Performance Overview",
 )
 
+# Shown by the graphs until the first data version is ready
+loading_figure = dict(data=[],
+                      layout=dict(layout,
+                                  annotations=[
+                                      dict(
+                                          text="Chargement des données...",
+                                          x=0.5,
+                                          y=0.5,
+                                          align="center",
+                                          showarrow=False,
+                                          xref="paper",
+                                          yref="paper",
+                                      )
+                                  ]))
+
+# Stored instead of the outputs that failed to build, the browser cannot
+# compute them
+error_figure = dict(data=[],
+                    layout=dict(layout,
+                                annotations=[
+                                    dict(
+                                        text="Erreur lors du calcul",
+                                        x=0.5,
+                                        y=0.5,
+                                        align="center",
+                                        showarrow=False,
+                                        xref="paper",
+                                        yref="paper",
+                                    )
+                                ]))
+error_text = ["Erreur"] * 4
+
+# Shown by the live graphs until the first record of the session
+waiting_figure = dict(data=[],
+                      layout=dict(layout,
+                                  annotations=[
+                                      dict(
+                                          text="En attente de la séance...",
+                                          x=0.5,
+                                          y=0.5,
+                                          align="center",
+                                          showarrow=False,
+                                          xref="paper",
+                                          yref="paper",
+                                      )
+                                  ]))
+
 # Create app layout
 app.layout = html.Div(
     [
         dcc.Store(id="aggregate_data"),
+        dcc.Store(id="aggregate_version"),
+        dcc.Interval(id="aggregate_interval", interval=LOADING_INTERVAL * 1000),
+        dcc.Store(id="live_cursor"),
+        dcc.Interval(id="live_interval",
+                     interval=LIVE_INTERVAL * 1000,
+                     disabled=feed is None),
         # empty Div to trigger javascript file for graph resizing
         html.Div(id="output-clientside"),
         html.Div(
@@ -156,6 +607,14 @@ app.layout = html.Div(
                             multi=False,
                             className="dcc_control",
                         ),
+                        html.P("Équipe:", className="team_label"),
+                        dcc.Dropdown(
+                            id="team_selector",
+                            options=team_options,
+                            value=next(iter(TEAMS), None),
+                            multi=False,
+                            className="dcc_control",
+                        ),
                     ],
                     className="pretty_container four columns",
                     id="cross-filter-options",
@@ -203,6 +662,7 @@ app.layout = html.Div(
                         html.Div(
                             [
                                 dcc.Graph(id="charge_graph",
+                                          figure=loading_figure,
                                           config={
                                               'staticPlot': True,
                                           })
@@ -217,6 +677,48 @@ app.layout = html.Div(
             ],
             className="row flex-display",
         ),
+        html.Div(
+            [
+                html.Div(
+                    [
+                        dcc.Graph(id="live_hr_graph",
+                                  figure=waiting_figure,
+                                  config={
+                                      'staticPlot': True,
+                                  })
+                    ],
+                    className="pretty_container twelve columns",
+                ),
+            ],
+            className="row flex-display",
+            style=None if feed else {"display": "none"},
+        ),
+        html.Div(
+            [
+                html.Div(
+                    [
+                        dcc.Graph(id="live_zones_graph",
+                                  figure=waiting_figure,
+                                  config={
+                                      'staticPlot': True,
+                                  })
+                    ],
+                    className="pretty_container seven columns",
+                ),
+                html.Div(
+                    [
+                        dcc.Graph(id="live_sprints_graph",
+                                  figure=waiting_figure,
+                                  config={
+                                      'staticPlot': True,
+                                  })
+                    ],
+                    className="pretty_container five columns",
+                ),
+            ],
+            className="row flex-display",
+            style=None if feed else {"display": "none"},
+        ),
         html.Div(
             [
                 html.Div(
@@ -228,16 +730,22 @@ app.layout = html.Div(
                             value=list(c.DPZV.keys())[0],
                             className="dcc_control",
                         ),
-                        dcc.Graph(id="dt_graph", config={
-                            'staticPlot': True,
-                        })
+                        dcc.Graph(id="dt_graph",
+                                  figure=loading_figure,
+                                  config={
+                                      'staticPlot': True,
+                                  })
                     ],
                     className="pretty_container seven columns",
                 ),
                 html.Div(
-                    [dcc.Graph(id="fc_graph", config={
-                        'staticPlot': True,
-                    })],
+                    [
+                        dcc.Graph(id="fc_graph",
+                                  figure=loading_figure,
+                                  config={
+                                      'staticPlot': True,
+                                  })
+                    ],
                     className="pretty_container five columns",
                 ),
             ],
@@ -248,6 +756,7 @@ app.layout = html.Div(
                 html.Div(
                     [
                         dcc.Graph(id="pie_dt_graph",
+                                  figure=loading_figure,
                                   config={
                                       'staticPlot': True,
                                   })
@@ -257,6 +766,7 @@ app.layout = html.Div(
                 html.Div(
                     [
                         dcc.Graph(id="sprints_graph",
+                                  figure=loading_figure,
                                   config={
                                       'staticPlot': True,
                                   })
@@ -273,13 +783,15 @@ app.layout = html.Div(
                         html.H6("Données Brutes"),
                         dash_table.DataTable(
                             id="table",
-                            columns=[{
-                                "name": i,
-                                "id": i
-                            } for i in c.PRETTY_COLNAMES],
+                            columns=table_columns,
                             page_current=0,
                             page_size=10,
                             page_action="custom",
+                            sort_action="custom",
+                            sort_mode="single",
+                            sort_by=[],
+                            filter_action="custom",
+                            filter_query="",
                             style_header={
                                 "border": "1px solid #12202b",
                                 "textAlign": "center",
@@ -301,14 +813,68 @@ app.layout = html.Div(
                     className="pretty_container seven columns",
                 ),
                 html.Div(
-                    [dcc.Graph(id="power_graph", config={
-                        'staticPlot': True,
-                    })],
+                    [
+                        dcc.Graph(id="power_graph",
+                                  figure=loading_figure,
+                                  config={
+                                      'staticPlot': True,
+                                  })
+                    ],
                     className="pretty_container five columns",
                 ),
             ],
             className="row flex-display",
         ),
+        html.Div(
+            [
+                html.Div(
+                    [
+                        dcc.Dropdown(
+                            id="load_selector",
+                            options=load_options,
+                            multi=False,
+                            value=list(c.LOADS.keys())[0],
+                            className="dcc_control",
+                        ),
+                        dcc.Graph(id="acwr_graph",
+                                  figure=loading_figure,
+                                  config={
+                                      'staticPlot': True,
+                                  })
+                    ],
+                    className="pretty_container twelve columns",
+                ),
+            ],
+            className="row flex-display",
+        ),
+        html.Div(
+            [
+                html.Div(
+                    [
+                        dcc.DatePickerRange(
+                            id="date_range",
+                            display_format="DD/MM/YYYY",
+                            first_day_of_week=1,
+                            className="dcc_control",
+                        ),
+                        dcc.Dropdown(
+                            id="totals_selector",
+                            options=totals_options,
+                            multi=False,
+                            value=list(c.TOTALS.keys())[0],
+                            className="dcc_control",
+                        ),
+                        dcc.Graph(id="totals_graph",
+                                  figure=loading_figure,
+                                  config={
+                                      'staticPlot': True,
+                                  })
+                    ],
+                    className="pretty_container twelve columns",
+                ),
+            ],
+            className="row flex-display",
+        ),
     ],
     id="mainContainer",
     style={
@@ -318,8 +884,34 @@ app.layout = html.Div(
 )
 
 
-# Selectors -> charge text
+# Team, data version -> aggregate data of the team, polled faster until the
+# team is loaded
 @app.callback(
+    [
+        Output("aggregate_data", "data"),
+        Output("aggregate_version", "data"),
+        Output("aggregate_interval", "interval"),
+    ],
+    [
+        Input("aggregate_interval", "n_intervals"),
+        Input("team_selector", "value"),
+    ],
+    [State("aggregate_version", "data")],
+)
+def push_aggregate_data(n_intervals, team_selector, pushed):
+    version = figure_store.version(team_selector)
+    if team_snapshot(team_selector) is None or version is None:
+        return dash.no_update, dash.no_update, LOADING_INTERVAL * 1000
+    if pushed == [team_selector, version]:
+        raise PreventUpdate
+
+    # encoded once per version, not by Dash on each request
+    return (serialize.encoded(figure_store.encoded_bundle(team_selector)),
+            [team_selector, version], WATCH_INTERVAL * 1000)
+
+
+# Selectors -> charge text
+@clientside(
     [
         Output("mental_text", "children"),
         Output("rpe_text", "children"),
@@ -329,9 +921,16 @@ app.layout = html.Div(
     [
         Input("timeframe_selector", "value"),
         Input("population_selector", "value"),
+        Input("team_selector", "value"),
     ],
 )
-def update_mentalfc_text(timeframe_selector, population_selector):
+@figure_store.precomputed(c.TIME_FRAME_VALUES,
+                          c.POPULATION,
+                          TEAMS,
+                          failed=error_text)
+@metrics.timed
+def update_mentalfc_text(timeframe_selector, population_selector,
+                         team_selector):
     timeframe = c.TIME_FRAME_VALUES[timeframe_selector]
 
     if population_selector == "ALL":
@@ -339,8 +938,12 @@ def update_mentalfc_text(timeframe_selector, population_selector):
     else:
         population = population_selector
 
-    rpe_filtered = etl.filter_dataset(rpe, timeframe, population)
-    seances_filtered = etl.filter_dataset(seances, timeframe, population)
+    current = snapshot
+    rpe_filtered = filter_cache.filter(current.rpe[team_selector], timeframe,
+                                       population)
+    seances_filtered = filter_cache.filter(current.seances[team_selector],
+                                           timeframe, population)
+    metrics.lap("filter")
 
     return round(rpe_filtered.RpeMenAp.mean(), 2), round(
         rpe_filtered.RpePhyAp.mean(), 2), round(
@@ -350,14 +953,20 @@ def update_mentalfc_text(timeframe_selector, population_selector):
 
 
 # Selectors -> charge graph
-@app.callback(
+@clientside(
     Output("charge_graph", "figure"),
     [
         Input("timeframe_selector", "value"),
-        Input("population_selector", "value")
+        Input("population_selector", "value"),
+        Input("team_selector", "value")
     ],
 )
-def make_charge_figure(timeframe_selector, population_selector):
+@figure_store.precomputed(c.TIME_FRAME_VALUES,
+                          c.POPULATION,
+                          TEAMS,
+                          failed=error_figure)
+@metrics.timed
+def make_charge_figure(timeframe_selector, population_selector, team_selector):
 
     layout_charge = copy.deepcopy(layout)
 
@@ -371,11 +980,16 @@ def make_charge_figure(timeframe_selector, population_selector):
     else:
         population = population_selector
 
-    rpe_filtered = etl.filter_dataset(rpe, timeframe, population)
+    rpe_filtered = filter_cache.filter(snapshot.rpe[team_selector], timeframe,
+                                       population)
+    metrics.lap("filter")
     rpe_graph = rpe_filtered.groupby(["Date"]).mean()
+    metrics.lap("aggregate")
     index = rpe_graph.index
-    physical = rpe_graph.RpePhyAp
-    mental = rpe_graph.RpeMenAp
+    physical = downsample.downsample(index, rpe_graph.RpePhyAp,
+                                     downsample.budget(8), DOWNSAMPLING)
+    mental = downsample.downsample(index, rpe_graph.RpeMenAp,
+                                   downsample.budget(8), DOWNSAMPLING)
 
     if index is None:
         annotation = dict(
@@ -395,8 +1009,8 @@ def make_charge_figure(timeframe_selector, population_selector):
                 type="scatter",
                 mode="lines+markers",
                 name="RPE (Physique)",
-                x=index,
-                y=physical,
+                x=physical[0],
+                y=physical[1],
                 line=dict(shape="spline", smoothing=2, width=1,
                           color="#5e35b1"),
                 marker=dict(symbol="diamond-open"),
@@ -405,8 +1019,8 @@ def make_charge_figure(timeframe_selector, population_selector):
                 type="scatter",
                 mode="lines+markers",
                 name="Fatigue Mentale",
-                x=index,
-                y=mental,
+                x=mental[0],
+                y=mental[1],
                 line=dict(shape="spline", smoothing=2, width=1,
                           color="#43a047"),
                 marker=dict(symbol="diamond-open"),
@@ -428,15 +1042,23 @@ def make_charge_figure(timeframe_selector, population_selector):
 
 
 # Selectors -> dt graph
-@app.callback(
+@clientside(
     Output("dt_graph", "figure"),
     [
         Input("timeframe_selector", "value"),
         Input("population_selector", "value"),
+        Input("team_selector", "value"),
         Input("dpzv_selector", "value"),
     ],
 )
-def make_dt_figure(timeframe_selector, population_selector, dpzv_selector):
+@figure_store.precomputed(c.TIME_FRAME_VALUES,
+                          c.POPULATION,
+                          TEAMS,
+                          c.DPZV,
+                          failed=error_figure)
+@metrics.timed
+def make_dt_figure(timeframe_selector, population_selector, team_selector,
+                   dpzv_selector):
 
     layout_dt = copy.deepcopy(layout)
 
@@ -447,8 +1069,12 @@ def make_dt_figure(timeframe_selector, population_selector, dpzv_selector):
     else:
         population = population_selector
 
-    seances_filtered = etl.filter_dataset(seances, timeframe, population)
-    seances_graph = seances_filtered.groupby(["Nom"]).sum()
+    seances_filtered = filter_cache.filter(snapshot.seances[team_selector],
+                                           timeframe, population)
+    metrics.lap("filter")
+    seances_graph = seances_filtered.groupby(["Nom"],
+                                             observed=True).sum().sort_index()
+    metrics.lap("aggregate")
     index = seances_graph.index
     y = seances_graph[dpzv_selector]
 
@@ -493,14 +1119,20 @@ def make_dt_figure(timeframe_selector, population_selector, dpzv_selector):
 
 
 # Main graph -> fc graph
-@app.callback(
+@clientside(
     Output("fc_graph", "figure"),
     [
         Input("timeframe_selector", "value"),
-        Input("population_selector", "value")
+        Input("population_selector", "value"),
+        Input("team_selector", "value")
     ],
 )
-def make_fc_figure(timeframe_selector, population_selector):
+@figure_store.precomputed(c.TIME_FRAME_VALUES,
+                          c.POPULATION,
+                          TEAMS,
+                          failed=error_figure)
+@metrics.timed
+def make_fc_figure(timeframe_selector, population_selector, team_selector):
 
     layout_fc = copy.deepcopy(layout)
 
@@ -511,9 +1143,12 @@ def make_fc_figure(timeframe_selector, population_selector):
     else:
         population = population_selector
 
-    seances_filtered = etl.filter_dataset(seances, timeframe, population)
+    seances_filtered = filter_cache.filter(snapshot.seances[team_selector],
+                                           timeframe, population)
+    metrics.lap("filter")
     seance_graph = seances_filtered[seances_filtered.Fcmax > 0].groupby(
-        ["Nom"]).mean()
+        ["Nom"], observed=True).mean().sort_index()
+    metrics.lap("aggregate")
     x = seance_graph.RrBfMoy
     y = seance_graph.RrHfMoy
     text = seance_graph.index
@@ -572,14 +1207,20 @@ def make_fc_figure(timeframe_selector, population_selector):
 
 
 # Selectors, main graph -> sprint graph
-@app.callback(
+@clientside(
     Output("sprints_graph", "figure"),
     [
         Input("timeframe_selector", "value"),
-        Input("population_selector", "value")
+        Input("population_selector", "value"),
+        Input("team_selector", "value")
     ],
 )
-def make_sprint_figure(timeframe_selector, population_selector):
+@figure_store.precomputed(c.TIME_FRAME_VALUES,
+                          c.POPULATION,
+                          TEAMS,
+                          failed=error_figure)
+@metrics.timed
+def make_sprint_figure(timeframe_selector, population_selector, team_selector):
 
     layout_sprint = copy.deepcopy(layout)
 
@@ -593,11 +1234,15 @@ def make_sprint_figure(timeframe_selector, population_selector):
     else:
         population = population_selector
 
-    seances_filtered = etl.filter_dataset(seances, timeframe, population)
-    seances_graph = seances_filtered.groupby(["Nom", "Date"
-                                             ]).sum().groupby(["Date"]).mean()
+    seances_filtered = filter_cache.filter(snapshot.seances[team_selector],
+                                           timeframe, population)
+    metrics.lap("filter")
+    seances_graph = seances_filtered.groupby(
+        ["Nom", "Date"], observed=True).sum().groupby(["Date"]).mean()
+    metrics.lap("aggregate")
     y = seances_graph.Sprints
     index = seances_graph.index
+    x, y = downsample.downsample(index, y, downsample.budget(7), DOWNSAMPLING)
 
     if index is None:
         annotation = dict(
@@ -617,7 +1262,7 @@ def make_sprint_figure(timeframe_selector, population_selector):
                 type="scatter",
                 mode="lines+markers",
                 name="Sprints",
-                x=index,
+                x=x,
                 y=y,
                 line=dict(shape="spline", smoothing=2, width=1,
                           color="#43a047"),
@@ -641,14 +1286,20 @@ def make_sprint_figure(timeframe_selector, population_selector):
 
 
 # Selectors, main graph -> pie graph
-@app.callback(
+@clientside(
     Output("pie_dt_graph", "figure"),
     [
         Input("timeframe_selector", "value"),
-        Input("population_selector", "value")
+        Input("population_selector", "value"),
+        Input("team_selector", "value")
     ],
 )
-def make_pie_figure(timeframe_selector, population_selector):
+@figure_store.precomputed(c.TIME_FRAME_VALUES,
+                          c.POPULATION,
+                          TEAMS,
+                          failed=error_figure)
+@metrics.timed
+def make_pie_figure(timeframe_selector, population_selector, team_selector):
 
     layout_pie = copy.deepcopy(layout)
 
@@ -659,9 +1310,12 @@ def make_pie_figure(timeframe_selector, population_selector):
     else:
         population = population_selector
 
-    seances_filtered = etl.filter_dataset(seances, timeframe, population)
+    seances_filtered = filter_cache.filter(snapshot.seances[team_selector],
+                                           timeframe, population)
+    metrics.lap("filter")
 
     dpzv_values = [seances_filtered[dpzv].mean() for dpzv in c.DPZV.keys()]
+    metrics.lap("aggregate")
     dpzv_text = [
         "Distance Passée dans l'Interval {}".format(dpzv)
         for dpzv in c.DPZV.values()
@@ -690,29 +1344,291 @@ def make_pie_figure(timeframe_selector, population_selector):
     return figure
 
 
-# Selectors, main -> table
+# Selectors, load selector -> acwr graph
+@clientside(
+    Output("acwr_graph", "figure"),
+    [
+        Input("timeframe_selector", "value"),
+        Input("population_selector", "value"),
+        Input("team_selector", "value"),
+        Input("load_selector", "value"),
+    ],
+)
+@figure_store.precomputed(c.TIME_FRAME_VALUES,
+                          c.POPULATION,
+                          TEAMS,
+                          c.LOADS,
+                          failed=error_figure)
+@metrics.timed
+def make_acwr_figure(timeframe_selector, population_selector, team_selector,
+                     load_selector):
+
+    layout_acwr = copy.deepcopy(layout)
+
+    timeframe = c.TIME_FRAME_VALUES[timeframe_selector]
+
+    if not timeframe:
+        timeframe = 31
+
+    current = snapshot
+    ratios = current.workload[team_selector][load_selector]
+    rolling = ratios.rolling.iloc[-timeframe:]
+    ewma = ratios.ewma.iloc[-timeframe:]
+
+    if population_selector != "ALL":
+        positions = current.positions[team_selector]
+        players = positions.index[positions == population_selector]
+        rolling = rolling.loc[:, rolling.columns.isin(players)]
+        ewma = ewma.loc[:, ewma.columns.isin(players)]
+    metrics.lap("filter")
+
+    rolling = rolling.mean(axis=1)
+    ewma = ewma.mean(axis=1)
+    metrics.lap("aggregate")
+
+    if rolling.empty:
+        annotation = dict(
+            text="Pas de données disponibles",
+            x=0.5,
+            y=0.5,
+            align="center",
+            showarrow=False,
+            xref="paper",
+            yref="paper",
+        )
+        layout_acwr["annotations"] = [annotation]
+        data = []
+    else:
+        rolling = downsample.downsample(rolling.index, rolling,
+                                        downsample.budget(12), DOWNSAMPLING)
+        ewma = downsample.downsample(ewma.index, ewma, downsample.budget(12),
+                                     DOWNSAMPLING)
+        data = [
+            dict(
+                type="scatter",
+                mode="lines+markers",
+                name="Moyennes Glissantes",
+                x=rolling[0],
+                y=rolling[1],
+                line=dict(shape="spline", smoothing=2, width=1,
+                          color="#5e35b1"),
+                marker=dict(symbol="diamond-open"),
+            ),
+            dict(
+                type="scatter",
+                mode="lines+markers",
+                name="Moyennes Exponentielles",
+                x=ewma[0],
+                y=ewma[1],
+                line=dict(shape="spline", smoothing=2, width=1,
+                          color="#43a047"),
+                marker=dict(symbol="diamond-open"),
+            ),
+        ]
+
+        layout_acwr[
+            "title"] = "Ratio Charge Aiguë:Chronique sur {} Jours".format(
+                timeframe)
+        layout_acwr["margin"] = dict(l=40, r=0, t=40, b=40)
+        layout_acwr["xaxis"] = {"title": "Jours", "fixedrange": True}
+        layout_acwr["yaxis"] = {"title": "Ratio", "fixedrange": True}
+        # usual target zone of the ratio
+        layout_acwr["shapes"] = [
+            dict(type="rect",
+                 xref="paper",
+                 yref="y",
+                 x0=0,
+                 x1=1,
+                 y0=0.8,
+                 y1=1.3,
+                 fillcolor="#43a047",
+                 opacity=0.15,
+                 line=dict(width=0))
+        ]
+
+    figure = dict(data=data, layout=layout_acwr)
+    return figure
+
+
+# Team, data version -> date range, the last 31 days by default
 @app.callback(
-    Output("table", "data"),
-    [Input("table", "page_current"),
-     Input("table", "page_size")],
+    [
+        Output("date_range", "min_date_allowed"),
+        Output("date_range", "max_date_allowed"),
+        Output("date_range", "start_date"),
+        Output("date_range", "end_date"),
+    ],
+    [
+        Input("team_selector", "value"),
+        Input("aggregate_version", "data"),
+    ],
+    [State("date_range", "start_date"),
+     State("date_range", "end_date")],
 )
-def make_table(page_current, page_size):
-    table = seances[c.COLNAMES]
-    table.columns = c.PRETTY_COLNAMES
+def update_date_range(team_selector, version, start_date, end_date):
+    current = team_snapshot(team_selector)
+    if current is None:
+        raise PreventUpdate
+
+    days = current.totals[team_selector].days
+    if not len(days):
+        raise PreventUpdate
+
+    first, last = days[0].date(), days[-1].date()
+    selected = [
+        date for date in [start_date, end_date]
+        if date is not None and first <= pd.Timestamp(date).date() <= last
+    ]
+    if len(selected) < 2:
+        start_date, end_date = days[-31:][0].date(), last
 
-    return table.iloc[page_current * page_size:(page_current + 1) *
-                      page_size].to_dict("records")
+    return first, last, start_date, end_date
 
 
-# Selectors, main graph -> power graph
+# Date range, selectors -> totals graph
 @app.callback(
+    Output("totals_graph", "figure"),
+    [
+        Input("date_range", "start_date"),
+        Input("date_range", "end_date"),
+        Input("population_selector", "value"),
+        Input("team_selector", "value"),
+        Input("totals_selector", "value"),
+    ],
+)
+@metrics.timed
+def make_totals_figure(start_date, end_date, population_selector, team_selector,
+                       totals_selector):
+    current = team_snapshot(team_selector)
+    if current is None or start_date is None or end_date is None:
+        return loading_figure
+
+    layout_totals = copy.deepcopy(layout)
+
+    range_totals = current.totals[team_selector]
+    columns = TOTALS_COLUMNS[totals_selector]
+    players = range_totals.counts(start_date, end_date)[columns].sum(axis=1) > 0
+    groups = range_totals.groups
+    if population_selector != "ALL":
+        positions = current.positions[team_selector]
+        players &= range_totals.players.isin(
+            positions.index[positions == population_selector])
+        groups = groups[groups == population_selector]
+    metrics.lap("filter")
+
+    # the players, then the average player of each position
+    if totals_selector in AVERAGED_TOTALS:
+        values = range_totals.means(start_date, end_date)[players]
+        averages = range_totals.group_means(start_date, end_date)
+    else:
+        values = range_totals.sums(start_date, end_date)[players]
+        averages = range_totals.group_sums(start_date, end_date).div(
+            range_totals.group_players(start_date, end_date).replace(0, np.nan),
+            axis=0)
+    values = pd.concat([
+        values[columns],
+        averages.loc[groups,
+                     columns].rename(index=lambda group: "Moyenne {}".format(
+                         c.POPULATION.get(group, group)))
+    ])
+    if totals_selector == "TZFC":
+        values = values / 60
+    metrics.lap("aggregate")
+
+    if not players.any():
+        annotation = dict(
+            text="Pas de données disponibles",
+            x=0.5,
+            y=0.5,
+            align="center",
+            showarrow=False,
+            xref="paper",
+            yref="paper",
+        )
+        layout_totals["annotations"] = [annotation]
+        data = []
+    else:
+        names = dict(c.DPZV, **c.TZFC)
+        colors = ["#43a047", "#00acc1", "#1e88e5", "#5e35b1", "#d81b60"]
+        data = [
+            dict(
+                type="bar",
+                name=names.get(col, c.TOTALS[totals_selector]),
+                x=values.index,
+                y=values[col],
+                marker=dict(color=color),
+            ) for col, color in zip(columns, colors)
+        ]
+
+        layout_totals["title"] = "{} du {:%d/%m/%Y} au {:%d/%m/%Y}".format(
+            c.TOTALS[totals_selector], pd.Timestamp(start_date),
+            pd.Timestamp(end_date))
+        layout_totals["barmode"] = "stack"
+        layout_totals["margin"] = dict(l=45, r=0, t=40, b=80)
+        layout_totals["xaxis"] = {"title": "Joueuses", "fixedrange": True}
+        layout_totals["yaxis"] = {
+            "title":
+                dict(DPZV="Distance (m)",
+                     TZFC="Temps (min)",
+                     Sprints="Sprints",
+                     Power="Puissance")[totals_selector],
+            "fixedrange":
+                True
+        }
+
+    figure = dict(data=data, layout=layout_totals)
+    return figure
+
+
+# Selectors, main, data version -> table
+@app.callback(
+    [Output("table", "data"),
+     Output("table", "page_count")],
+    [
+        Input("timeframe_selector", "value"),
+        Input("population_selector", "value"),
+        Input("team_selector", "value"),
+        Input("table", "page_current"),
+        Input("table", "page_size"),
+        Input("table", "sort_by"),
+        Input("table", "filter_query"),
+        Input("aggregate_version", "data"),
+    ],
+)
+@metrics.timed
+def make_table(timeframe_selector, population_selector, team_selector,
+               page_current, page_size, sort_by, filter_query, version):
+    current = team_snapshot(team_selector)
+    if current is None:
+        return [], 1
+
+    timeframe = c.TIME_FRAME_VALUES[timeframe_selector]
+
+    if population_selector == "ALL":
+        population = None
+    else:
+        population = population_selector
+
+    return current.table[team_selector].page(timeframe, population, sort_by,
+                                             filter_query, page_current,
+                                             page_size)
+
+
+# Selectors, main graph -> power graph
+@clientside(
     Output("power_graph", "figure"),
     [
         Input("timeframe_selector", "value"),
-        Input("population_selector", "value")
+        Input("population_selector", "value"),
+        Input("team_selector", "value")
     ],
 )
-def make_power_figure(timeframe_selector, population_selector):
+@figure_store.precomputed(c.TIME_FRAME_VALUES,
+                          c.POPULATION,
+                          TEAMS,
+                          failed=error_figure)
+@metrics.timed
+def make_power_figure(timeframe_selector, population_selector, team_selector):
 
     layout_power = copy.deepcopy(layout)
 
@@ -726,11 +1642,15 @@ def make_power_figure(timeframe_selector, population_selector):
     else:
         population = population_selector
 
-    seances_filtered = etl.filter_dataset(seances, timeframe, population)
+    seances_filtered = filter_cache.filter(snapshot.seances[team_selector],
+                                           timeframe, population)
+    metrics.lap("filter")
     seances_graph = seances_filtered[seances_filtered.Power < 200].groupby(
-        ["Nom", "Date"]).sum().groupby(["Date"]).mean()
+        ["Nom", "Date"], observed=True).sum().groupby(["Date"]).mean()
+    metrics.lap("aggregate")
     y = seances_graph.Power
     index = seances_graph.index
+    x, y = downsample.downsample(index, y, downsample.budget(5), DOWNSAMPLING)
 
     if index is None:
         annotation = dict(
@@ -750,7 +1670,7 @@ def make_power_figure(timeframe_selector, population_selector):
                 type="scatter",
                 mode="lines+markers",
                 name="Puissance",
-                x=index,
+                x=x,
                 y=y,
                 line=dict(shape="spline", smoothing=2, width=1,
                           color="#5e35b1"),
@@ -774,6 +1694,142 @@ def make_power_figure(timeframe_selector, population_selector):
     return figure
 
 
+def make_live_hr_figure(players, points):
+    """Heart rates of the session, one line per player
+    
+    The lines are in the order of the players of the session, which the
+    trace indices of extendData refer to.
+    
+    Arguments:
+        players {list} -- players of the session
+        points {dict} -- times and rates of each player, see live.Session
+    
+    Returns:
+        [dict] -- figure
+    """
+    layout_live = copy.deepcopy(layout)
+    empty = (np.array([], dtype="datetime64[ms]"), np.array([]))
+    data = [
+        dict(
+            type="scatter",
+            mode="lines",
+            name=player,
+            x=points.get(player, empty)[0],
+            y=points.get(player, empty)[1],
+            line=dict(width=1),
+        ) for player in players
+    ]
+
+    layout_live["title"] = "Fréquence Cardiaque en Direct"
+    layout_live["margin"] = dict(l=40, r=0, t=40, b=40)
+    layout_live["xaxis"] = {"title": "Heure", "fixedrange": True}
+    layout_live["yaxis"] = {"title": "FC Moyenne (bpm)", "fixedrange": True}
+
+    figure = dict(data=data, layout=layout_live)
+    return figure
+
+
+def make_live_totals_figures(totals):
+    """Time in each heart rate zone and sprints of each player, so far
+    
+    Arguments:
+        totals {DataFrame} -- running totals, see live.Session
+    
+    Returns:
+        [tuple] -- zones and sprints figures
+    """
+    layout_zones = copy.deepcopy(layout)
+    layout_sprints = copy.deepcopy(layout)
+
+    colors = ["#43a047", "#00acc1", "#1e88e5", "#5e35b1", "#d81b60"]
+    zones = [
+        dict(
+            type="bar",
+            name=name,
+            x=totals.index,
+            y=totals[col] / 60,
+            marker=dict(color=color),
+        ) for (col, name), color in zip(c.TZFC.items(), colors)
+    ]
+    sprints = [
+        dict(
+            type="bar",
+            name="Sprints",
+            x=totals.index,
+            y=totals.Sprints,
+            marker=dict(color="#fbc02d"),
+        )
+    ]
+
+    layout_zones["title"] = "Temps par Zones de FC en Direct"
+    layout_zones["barmode"] = "stack"
+    layout_zones["margin"] = dict(l=45, r=0, t=40, b=80)
+    layout_zones["xaxis"] = {"title": "Joueuses", "fixedrange": True}
+    layout_zones["yaxis"] = {"title": "Temps (min)", "fixedrange": True}
+
+    layout_sprints["title"] = "Sprints en Direct"
+    layout_sprints["margin"] = dict(l=40, r=0, t=40, b=80)
+    layout_sprints["xaxis"] = {"title": "Joueuses", "fixedrange": True}
+    layout_sprints["yaxis"] = {"title": "Sprints", "fixedrange": True}
+
+    return (dict(data=zones,
+                 layout=layout_zones), dict(data=sprints,
+                                            layout=layout_sprints))
+
+
+# Live feed -> live graphs. Only the heart rates recorded since the cursor
+# are sent, the whole figure when the session or its players change
+@app.callback(
+    [
+        Output("live_hr_graph", "figure"),
+        Output("live_hr_graph", "extendData"),
+        Output("live_zones_graph", "figure"),
+        Output("live_sprints_graph", "figure"),
+        Output("live_cursor", "data"),
+    ],
+    [Input("live_interval", "n_intervals")],
+    [State("live_cursor", "data")],
+)
+@metrics.timed
+def update_live_figures(n_intervals, cursor):
+    session = None if feed is None else feed.session
+    if session is None or session.key is None:
+        raise PreventUpdate
+
+    records = session.records
+    current = cursor is not None and cursor["session"] == session.key
+    # a worker behind the cursor waits for the next poll
+    if current and records <= cursor["records"]:
+        raise PreventUpdate
+
+    players, points, end = session.rates(cursor["points"] if current else 0)
+    if current and len(players) != cursor["players"]:
+        current = False
+        players, points, end = session.rates()
+    metrics.lap("aggregate")
+
+    if not current:
+        figure, extend = make_live_hr_figure(players, points), dash.no_update
+    elif points:
+        figure = dash.no_update
+        extend = [
+            dict(x=[times for times, _ in points.values()],
+                 y=[rates for _, rates in points.values()]),
+            [players.index(player) for player in points],
+            live.MAX_POINTS,
+        ]
+    else:
+        figure, extend = dash.no_update, dash.no_update
+    zones, sprints = make_live_totals_figures(session.totals())
+
+    return figure, extend, zones, sprints, dict(session=session.key,
+                                                records=records,
+                                                points=end,
+                                                players=len(players))
+
+
 # Main
 if __name__ == "__main__":
+    start()
+    start_feed()
     app.run_server(debug=True)
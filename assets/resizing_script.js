@@ -11,3 +11,44 @@ window.dash_clientside.clientside = {
     return null;
   }
 };
+
+// Output of a precomputed callback, read from the bundle pushed by the
+// server to aggregate_data (see FigureStore.encoded_bundle in
+// utils/store.py). Outputs missing from it, e.g. before the first bundle,
+// are left as they are: count is the number of outputs of the callback,
+// when it has several
+function precomputed(name, count) {
+  return function(bundle) {
+    var key = Array.prototype.slice.call(arguments, 1).join("|");
+    var outputs = bundle && bundle.outputs[name];
+    if (!outputs || !(key in outputs)) {
+      var no_update = window.dash_clientside.no_update;
+      if (!count) {
+        return no_update;
+      }
+      var unchanged = [];
+      for (var i = 0; i < count; i++) {
+        unchanged.push(no_update);
+      }
+      return unchanged;
+    }
+
+    // copied, plotly modifies the figures it draws
+    var output = JSON.parse(JSON.stringify(outputs[key]));
+    if (typeof output.layout === "number") {
+      output.layout = JSON.parse(JSON.stringify(bundle.layouts[output.layout]));
+    }
+    return output;
+  };
+}
+
+window.dash_clientside.precomputed = {
+  update_mentalfc_text: precomputed("update_mentalfc_text", 4),
+  make_charge_figure: precomputed("make_charge_figure"),
+  make_dt_figure: precomputed("make_dt_figure"),
+  make_fc_figure: precomputed("make_fc_figure"),
+  make_sprint_figure: precomputed("make_sprint_figure"),
+  make_pie_figure: precomputed("make_pie_figure"),
+  make_acwr_figure: precomputed("make_acwr_figure"),
+  make_power_figure: precomputed("make_power_figure")
+};
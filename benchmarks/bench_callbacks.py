@@ -0,0 +1,297 @@
+"""Callback latency benchmarks
+
+Times etl.filter_dataset and every callback of app.py over each selector
+combination, on the local data scaled to longer histories. Callbacks are
+timed as served (through the figure store and caches) and as computed from
+scratch, with the JSON serialization done by Dash timed separately.
+
+    python -m benchmarks.bench_callbacks --scales 1 10 50 --output run.json
+    python -m benchmarks.bench_callbacks --compare before.json after.json
+"""
+import argparse
+import datetime as dt
+import itertools
+import json
+import platform
+import resource
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import plotly.utils
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import app  # noqa: E402
+import utils.acwr as acwr  # noqa: E402
+import utils.controls as c  # noqa: E402
+import utils.etl as etl  # noqa: E402
+import utils.table as table  # noqa: E402
+import utils.totals as totals  # noqa: E402
+
+FIGURES = [
+    "update_mentalfc_text", "make_charge_figure", "make_fc_figure",
+    "make_sprint_figure", "make_pie_figure", "make_power_figure"
+]
+
+# page, sort and filter states of the table
+TABLE_STATES = [
+    (0, [], ""),
+    (5, [{
+        "column_id": "Fcmax",
+        "direction": "desc"
+    }], ""),
+    (0, [{
+        "column_id": "Nom",
+        "direction": "asc"
+    }], "{Fcmax} > 150"),
+]
+
+
+def scale_frame(frame, factor):
+    """Repeat a dataset further in the past, factor times its history"""
+    span = frame.Date.max() - frame.Date.min() + dt.timedelta(days=1)
+    copies = [frame.assign(Date=frame.Date - i * span) for i in range(factor)]
+    return pd.concat(copies, ignore_index=True)
+
+
+def scaled_snapshot(base, factor, version):
+    rpe, seances, tables, workload, range_totals = {}, {}, {}, {}, {}
+    for team in base.rpe:
+        rpe[team] = etl.Dataset(scale_frame(base.rpe[team].frame, factor),
+                                base.rpe[team].name, version)
+        seances[team] = etl.Dataset(
+            scale_frame(base.seances[team].frame, factor),
+            base.seances[team].name, version)
+        tables[team] = table.TableView(seances[team], c.COLNAMES)
+        workload[team] = {
+            load:
+                acwr.Workload().update(
+                    acwr.daily_loads(rpe[team].frame, seances[team].frame,
+                                     load)) for load in c.LOADS
+        }
+        range_totals[team] = totals.RangeTotals(seances[team].frame,
+                                                base.totals[team].columns,
+                                                base.positions[team])
+    return app.Snapshot(version, base.files, rpe, seances, tables,
+                        base.positions, workload, range_totals)
+
+
+def percentiles(samples):
+    samples = np.array(samples) * 1e3
+    return dict(p50_ms=float(np.percentile(samples, 50)),
+                p95_ms=float(np.percentile(samples, 95)),
+                mean_ms=float(samples.mean()),
+                n=len(samples))
+
+
+def timed(func, repeat, setup=None):
+    samples = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        result = func()
+        samples.append(time.perf_counter() - start)
+    return result, samples
+
+
+def peak_memory(func):
+    """Peak memory allocated by one call, in kB"""
+    tracemalloc.start()
+    func()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak / 1024
+
+
+def combinations(name):
+    domains = [c.TIME_FRAME_VALUES, c.POPULATION, app.TEAMS]
+    if name == "make_dt_figure":
+        domains.append(c.DPZV)
+    if name == "make_acwr_figure":
+        domains.append(c.LOADS)
+    return list(itertools.product(*domains))
+
+
+def bench_scale(base, factor, repeat):
+    app.snapshot = scaled_snapshot(base, factor, factor)
+    app.filter_cache.clear()
+
+    start = time.perf_counter()
+    for team in app.snapshot.rpe:
+        app.figure_store.rebuild(app.snapshot.version, team)
+    rebuild = time.perf_counter() - start
+
+    rpe = list(app.snapshot.rpe.values())
+    seances = list(app.snapshot.seances.values())
+    results = dict(
+        scale=factor,
+        rows=dict(rpe=sum(map(len, rpe)), seances=sum(map(len, seances))),
+        memory_kb=dict(
+            rpe=float(sum(etl.memory_usage(d.frame) for d in rpe) / 1024),
+            seances=float(
+                sum(etl.memory_usage(d.frame) for d in seances) / 1024)),
+        store_rebuild_ms=rebuild * 1e3,
+        targets={},
+    )
+
+    def record(target, args, served, computed, serialize, memory):
+        entry = results["targets"].setdefault(target, dict(combinations={}))
+        entry["combinations"]["|".join(map(str, args))] = dict(
+            served=percentiles(served),
+            computed=percentiles(computed),
+            serialize=percentiles(serialize),
+            peak_memory_kb=memory)
+
+    for dataset in rpe + seances:
+        for t, p in itertools.product(c.TIME_FRAME_VALUES, c.POPULATION):
+            args = (c.TIME_FRAME_VALUES[t], None if p == "ALL" else p)
+            call = lambda: etl.filter_dataset(dataset, *args)  # noqa: E731
+            _, samples = timed(call, repeat)
+            record("filter_dataset[{}]".format(dataset.name), (t, p), samples,
+                   samples, [0.], peak_memory(call))
+
+    for name in FIGURES + ["make_dt_figure", "make_acwr_figure"]:
+        served = app.figure_store.served(name)
+        computed = app.figure_store.builder(name)
+        for args in combinations(name):
+            output, served_samples = timed(lambda: served(*args), repeat)
+            _, computed_samples = timed(lambda: computed(*args),
+                                        repeat,
+                                        setup=app.filter_cache.clear)
+            _, serialize_samples = timed(
+                lambda: json.dumps(output, cls=plotly.utils.PlotlyJSONEncoder),
+                repeat)
+            app.filter_cache.clear()
+            record(name, args, served_samples, computed_samples,
+                   serialize_samples, peak_memory(lambda: computed(*args)))
+
+    # the last training, 31 days, and the whole history
+    make_totals = getattr(app.make_totals_figure, "__wrapped__",
+                          app.make_totals_figure)
+    for team, range_totals in app.snapshot.totals.items():
+        last = range_totals.days[-1]
+        ranges = dict(SHORT=last,
+                      LONG=range_totals.days[-31:][0],
+                      ALL=range_totals.days[0])
+        for (r, start), p, total in itertools.product(ranges.items(),
+                                                      c.POPULATION, c.TOTALS):
+            args = (start, last, p, team, total)
+            output, samples = timed(lambda: make_totals(*args), repeat)
+            _, serialize_samples = timed(
+                lambda: json.dumps(output, cls=plotly.utils.PlotlyJSONEncoder),
+                repeat)
+            record("make_totals_figure", (r, p, team, total), samples, samples,
+                   serialize_samples, peak_memory(lambda: make_totals(*args)))
+
+    make_table = getattr(app.make_table, "__wrapped__", app.make_table)
+    for t, p, team in itertools.product(c.TIME_FRAME_VALUES, c.POPULATION,
+                                        app.TEAMS):
+        for page, sort_by, filter_query in TABLE_STATES:
+            args = (t, p, team, page, 10, sort_by, filter_query, None)
+            output, served_samples = timed(lambda: make_table(*args), repeat)
+            _, computed_samples = timed(lambda: make_table(*args),
+                                        repeat,
+                                        setup=app.snapshot.table[team].clear)
+            _, serialize_samples = timed(
+                lambda: json.dumps(output, cls=plotly.utils.PlotlyJSONEncoder),
+                repeat)
+            app.snapshot.table[team].clear()
+            record("make_table", (t, p, team, page, sort_by, filter_query),
+                   served_samples, computed_samples, serialize_samples,
+                   peak_memory(lambda: make_table(*args)))
+
+    for entry in results["targets"].values():
+        for kind in ["served", "computed", "serialize"]:
+            entry[kind] = dict(
+                p50_ms=float(
+                    np.median([
+                        combination[kind]["p50_ms"]
+                        for combination in entry["combinations"].values()
+                    ])),
+                p95_ms=float(
+                    np.max([
+                        combination[kind]["p95_ms"]
+                        for combination in entry["combinations"].values()
+                    ])))
+
+    return results
+
+
+def summary(results):
+    for run in results["scales"]:
+        print("scale x{scale}: {rows[seances]} seances rows, "
+              "store rebuild {store_rebuild_ms:.0f}ms".format(**run))
+        for target, entry in run["targets"].items():
+            print("  {:<28} served p50 {:8.3f}ms p95 {:8.3f}ms | "
+                  "computed p50 {:8.3f}ms p95 {:8.3f}ms".format(
+                      target, entry["served"]["p50_ms"],
+                      entry["served"]["p95_ms"], entry["computed"]["p50_ms"],
+                      entry["computed"]["p95_ms"]))
+
+
+def compare(before, after):
+    """Print the p50 ratio of each target between two runs"""
+    old = {
+        (run["scale"], target): entry for run in before["scales"]
+        for target, entry in run["targets"].items()
+    }
+    for run in after["scales"]:
+        for target, entry in run["targets"].items():
+            previous = old.get((run["scale"], target))
+            if previous is None:
+                continue
+            print("x{:<4} {:<28}".format(run["scale"], target), end="")
+            for kind in ["served", "computed"]:
+                ratio = entry[kind]["p50_ms"] / max(previous[kind]["p50_ms"],
+                                                    1e-9)
+                print(" {} p50 {:7.3f}ms ({:5.2f}x)".format(
+                    kind, entry[kind]["p50_ms"], ratio),
+                      end="")
+            print()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scales",
+                        nargs="+",
+                        type=int,
+                        default=[1, 10, 50],
+                        help="history multipliers of the local data")
+    parser.add_argument("--repeat",
+                        type=int,
+                        default=20,
+                        help="calls per combination")
+    parser.add_argument("--output", help="JSON file for the results")
+    parser.add_argument("--compare",
+                        nargs=2,
+                        metavar=("BEFORE", "AFTER"),
+                        help="compare two result files and exit")
+    args = parser.parse_args()
+
+    if args.compare:
+        with open(args.compare[0]) as before, open(args.compare[1]) as after:
+            compare(json.load(before), json.load(after))
+        sys.exit()
+
+    base = app.load_snapshot(teams=app.TEAMS)
+    results = dict(
+        date=dt.datetime.now().isoformat(timespec="seconds"),
+        python=platform.python_version(),
+        pandas=pd.__version__,
+        repeat=args.repeat,
+        scales=[
+            bench_scale(base, factor, args.repeat) for factor in args.scales
+        ],
+        max_rss_kb=resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    )
+
+    summary(results)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
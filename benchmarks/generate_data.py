@@ -0,0 +1,265 @@
+"""Synthetic session and RPE workbooks
+
+Writes a data folder shaped like ./data (RPE/*.xlsx, Seances/*.xlsx and
+postes.xlsx, one workbook per session), with made up players, to test
+ingest and callbacks at scale without real athlete data.
+
+    python -m benchmarks.generate_data /tmp/data --players 30 --seasons 3
+    ASRUC_DATA_PATH=/tmp/data python app.py
+"""
+import argparse
+import datetime as dt
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import utils.controls as c
+
+POSTES = [("Pilier", "AV"), ("Talonneur", "AV"), ("Deuxième ligne", "AV"),
+          ("Troisième ligne", "AV"), ("Demi de mêlée", "AR"),
+          ("Demi d'ouverture", "AR"), ("Centre", "AR"), ("Ailier", "AR"),
+          ("Arrière", "AR")]
+
+# training weekdays, by number of sessions per week
+WEEKDAYS = {
+    1: [2],
+    2: [1, 3],
+    3: [0, 2, 3],
+    4: [0, 1, 3, 4],
+    5: [0, 1, 2, 3, 4]
+}
+
+SEASON_START = (9, 1)
+SEASON_WEEKS = 40
+
+# Groupe and Phase columns of the exports, not read by the app. They are kept
+# so that the generated workbooks are as wide as the real ones, and take as
+# long to parse
+DEFAULT_PHASES = "Warmup:1,Jeu:3,Repos:1"
+
+# Folder of each squad after the first, served as a team of its own
+TEAM_FOLDER = "Equipe{}"
+
+
+def parse_phases(phases):
+    """Parse a phase mix, e.g. "Warmup:1,Jeu:3,Repos:1"
+    
+    Arguments:
+        phases {str} -- comma separated phase:weight pairs
+    
+    Returns:
+        [tuple] -- phase names and probabilities
+    """
+    names, weights = zip(
+        *((name, float(weight))
+          for name, weight in (part.split(":") for part in phases.split(","))))
+    weights = np.array(weights)
+    return list(names), weights / weights.sum()
+
+
+def make_players(players, squads):
+    """Roster with made up names, and the matching postes table"""
+    rows = []
+    for squad in range(squads):
+        for i in range(players):
+            poste, position = POSTES[i % len(POSTES)]
+            rows.append(
+                dict(Prénom="Joueuse {}".format(i + 1),
+                     Nom="J{}{:03d}".format(chr(ord("A") + squad), i + 1),
+                     Poste=poste,
+                     Position=position))
+    return pd.DataFrame(rows, columns=["Prénom", "Nom", "Poste", "Position"])
+
+
+def session_dates(seasons, sessions_per_week, today):
+    """Training dates of the last seasons, up to today"""
+    last_season = today.year
+    if today.month < SEASON_START[0]:
+        last_season -= 1
+
+    dates = []
+    for season in range(last_season - seasons + 1, last_season + 1):
+        start = dt.date(season, *SEASON_START)
+        start -= dt.timedelta(days=start.weekday())
+        for week in range(SEASON_WEEKS):
+            for weekday in WEEKDAYS[sessions_per_week]:
+                date = start + dt.timedelta(weeks=week, days=weekday)
+                if date <= today:
+                    dates.append(date)
+    return dates
+
+
+def make_session(rng, roster, date, laps, phases):
+    """Per-lap GPS and heart rate rows of one session"""
+    names, weights = phases
+    n = len(roster) * laps
+
+    lap_time = rng.integers(60, 1200, n)
+    mmin = rng.normal(70, 20, n).clip(0, 160)
+    distance = (mmin * lap_time / 60).astype(int)
+
+    # distance split over the speed zones
+    shares = rng.dirichlet([4, 6, 3, 1.5, 0.5], n)
+    dpzv = (shares * distance[:, None]).astype(int)
+    dpzv[:, 0] += distance - dpzv.sum(axis=1)
+
+    fcmoy = rng.normal(150, 15, n).clip(90, 195).astype(int)
+    fcmin = (fcmoy - rng.integers(20, 60, n)).clip(50)
+    fcmax = (fcmoy + rng.integers(10, 40, n)).clip(max=215)
+
+    # time in each heart rate zone, in fractions of a day as in the exports
+    tzfc = rng.dirichlet([0.2, 1, 4, 4, 1], n) * lap_time[:, None] / 86400
+
+    X = pd.DataFrame({
+        "Groupe": rng.choice(["A", "B"], n),
+        "Nom": np.repeat(roster.Nom.values, laps),
+        "LapTime": [
+            dt.time(t // 3600, t // 60 % 60, t % 60) for t in lap_time.tolist()
+        ],
+        "Distance": distance,
+        "mmin": mmin.astype(int),
+        "Vmoy": (mmin * 0.06).round(1),
+        "Vmax": rng.normal(24, 4, n).clip(8, 34).round(1),
+        "Fcmoy": fcmoy,
+        "Fcmin": fcmin,
+        "Fcmax": fcmax,
+    })
+    for i, dpzv_name in enumerate(c.DPZV):
+        X[dpzv_name] = dpzv[:, i]
+    for i, tzfc_name in enumerate(c.TZFC):
+        X[tzfc_name] = tzfc[:, i]
+    X["Sprints"] = rng.poisson(dpzv[:, 3:].sum(axis=1) / 60)
+    X["RrHfMoy"] = rng.gamma(2, 1, n).round(1)
+    X["RrBfMoy"] = rng.gamma(1.5, 0.6, n).round(1)
+    X["HfBfMoy"] = (X.RrHfMoy / X.RrBfMoy.clip(0.1)).round(1)
+    X["Power"] = rng.normal(45, 25, n).clip(0, 260).round(1)
+    X["Phase"] = rng.choice(names, n, p=weights)
+    X["Date"] = pd.Timestamp(date)
+
+    return X
+
+
+def make_rpe(rng, roster, date):
+    """Ratings of perceived exertion of one session"""
+    n = len(roster)
+    return pd.DataFrame({
+        "Nom": roster.Nom.values,
+        "Prénom": roster.Prénom.values,
+        "RpePhyAv": rng.integers(1, 8, n),
+        "RpePhyAp": rng.integers(3, 11, n),
+        "RpeMenAv": rng.integers(1, 7, n),
+        "RpeMenAp": rng.integers(1, 10, n),
+        "RpeCoach": np.full(n, rng.integers(4, 10)),
+        "Date": pd.Timestamp(date),
+    })
+
+
+def generate(path,
+             players=25,
+             squads=1,
+             seasons=1,
+             sessions_per_week=3,
+             laps=6,
+             phases=DEFAULT_PHASES,
+             attendance=0.85,
+             columnar=False,
+             seed=0):
+    """Write a synthetic data folder
+    
+    The first squad is written to the folder itself, the next ones to a
+    sub-folder each, e.g. Equipe2/Seances, served as separate teams.
+    
+    Arguments:
+        path {str} -- output data folder
+    
+    Keyword Arguments:
+        players {int} -- players per squad (default: {25})
+        squads {int} -- number of squads (default: {1})
+        seasons {int} -- number of seasons, ending with the current one
+                         (default: {1})
+        sessions_per_week {int} -- between 1 and 5 (default: {3})
+        laps {int} -- laps per player and session (default: {6})
+        phases {str} -- phase mix (default: {DEFAULT_PHASES})
+        attendance {float} -- share of the roster at each session
+                              (default: {0.85})
+        columnar {bool} -- also write each dataset of a squad as one parquet
+                           file in its _columnar folder (default: {False})
+        seed {int} -- random seed (default: {0})
+    
+    Returns:
+        [int] -- number of sessions written, over every squad
+    """
+    rng = np.random.default_rng(seed)
+    path = Path(path)
+    rosters = make_players(players, squads)
+
+    phases = parse_phases(phases)
+    dates = session_dates(seasons, sessions_per_week, dt.date.today())
+
+    for squad in range(squads):
+        folder = path if not squad else path / TEAM_FOLDER.format(squad + 1)
+        roster = rosters.iloc[squad * players:(squad + 1) * players]
+        write_squad(rng, folder, roster, dates, laps, phases, attendance,
+                    columnar)
+
+    return len(dates) * squads
+
+
+def write_squad(rng, path, roster, dates, laps, phases, attendance, columnar):
+    """Write the workbooks of one squad, see generate"""
+    for name in ["RPE", "Seances"]:
+        (path / name).mkdir(parents=True, exist_ok=True)
+    roster.to_excel(path / "postes.xlsx", index=False)
+
+    sessions, rpes = [], []
+    for date in dates:
+        present = roster[rng.random(len(roster)) < attendance]
+        session = make_session(rng, present, date, laps, phases)
+        rpe = make_rpe(rng, present, date)
+
+        filename = "{:%Y%m%d}.xlsx".format(date)
+        session.to_excel(path / "Seances" / filename, index=False)
+        rpe.to_excel(path / "RPE" / filename, index=False)
+
+        if columnar:
+            sessions.append(session)
+            rpes.append(rpe)
+
+    if columnar:
+        (path / "_columnar").mkdir(exist_ok=True)
+        seances = pd.concat(sessions, ignore_index=True)
+        seances["LapTime"] = [
+            t.hour * 3600 + t.minute * 60 + t.second for t in seances.LapTime
+        ]
+        seances.to_parquet(path / "_columnar" / "Seances.parquet", index=False)
+        pd.concat(rpes, ignore_index=True).to_parquet(path / "_columnar" /
+                                                      "RPE.parquet",
+                                                      index=False)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("path", help="output data folder")
+    parser.add_argument("--players", type=int, default=25)
+    parser.add_argument("--squads", type=int, default=1)
+    parser.add_argument("--seasons", type=int, default=1)
+    parser.add_argument("--sessions-per-week",
+                        type=int,
+                        default=3,
+                        choices=sorted(WEEKDAYS))
+    parser.add_argument("--laps", type=int, default=6)
+    parser.add_argument("--phases",
+                        default=DEFAULT_PHASES,
+                        help="phase mix, as name:weight pairs")
+    parser.add_argument("--attendance", type=float, default=0.85)
+    parser.add_argument("--columnar",
+                        action="store_true",
+                        help="also write parquet files")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    count = generate(args.path, args.players, args.squads, args.seasons,
+                     args.sessions_per_week, args.laps, args.phases,
+                     args.attendance, args.columnar, args.seed)
+    print("{} sessions written to {}".format(count, args.path))
@@ -0,0 +1,86 @@
+"""Replay a session workbook as a live feed
+
+Appends the laps of a Seances workbook to a newline-delimited JSON file, as
+the receivers write it during a session, timestamped as they are written.
+Point the app to the file to watch the live graphs without receivers:
+
+    python -m benchmarks.replay_feed data/Seances/20200206.xlsx /tmp/live.ndjson
+    ASRUC_LIVE_FEED=/tmp/live.ndjson python app.py
+"""
+import argparse
+import datetime as dt
+import json
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import utils.etl as etl
+
+
+def records(workbook):
+    """Laps of a workbook as feed records, every player's first lap first"""
+    X = etl.read_workbook(workbook, etl.SCHEMAS["Seances"])
+    X["lap"] = X.groupby("Nom").cumcount()
+    X = X.sort_values("lap", kind="stable").drop(columns=["Date", "lap"])
+    return [{
+        col: value for col, value in row.items() if not pd.isna(value)
+    } for row in X.to_dict("records")]
+
+
+def _native(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(value)
+
+
+def replay(workbook, feed, interval=1., batch=1, loop=False):
+    """Append the records of a workbook to a feed file
+    
+    The feed is emptied first, which starts a new session in the app.
+    
+    Arguments:
+        workbook {str} -- Seances workbook
+        feed {str} -- feed file
+    
+    Keyword Arguments:
+        interval {float} -- seconds between writes (default: {1.})
+        batch {int} -- records per write (default: {1})
+        loop {bool} -- replay the workbook until interrupted
+                       (default: {False})
+    
+    Returns:
+        [int] -- number of records written
+    """
+    laps = records(workbook)
+    feed = Path(feed)
+    feed.write_text("")
+
+    written = 0
+    while True:
+        for start in range(0, len(laps), batch):
+            now = dt.datetime.now().isoformat(timespec="milliseconds")
+            lines = "".join(
+                json.dumps(dict(lap, Date=now), default=_native) + "\n"
+                for lap in laps[start:start + batch])
+            with open(feed, "a") as f:
+                f.write(lines)
+            written += len(laps[start:start + batch])
+            time.sleep(interval)
+        if not loop:
+            return written
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("workbook", help="Seances workbook")
+    parser.add_argument("feed", help="feed file, emptied first")
+    parser.add_argument("--interval", type=float, default=1.)
+    parser.add_argument("--batch", type=int, default=1)
+    parser.add_argument("--loop", action="store_true")
+    args = parser.parse_args()
+
+    count = replay(args.workbook, args.feed, args.interval, args.batch,
+                   args.loop)
+    print("{} records written to {}".format(count, args.feed))
@@ -0,0 +1,51 @@
+# Gunicorn settings, read from the working directory by `gunicorn app:server`
+import gc
+import itertools
+import multiprocessing
+import os
+import signal
+
+# Import the app once in the master process and fork the workers from it.
+# Importing does not load the data, so the master binds at once. Once the
+# first workers are forked, it loads the datasets in the background, once for
+# every worker, and replaces the workers by ones forked with the data in
+# memory. Until then the workers answer /healthz, and /readyz fails.
+preload_app = True
+
+# The workers share the datasets loaded by the master, use every cpu
+workers = int(os.environ.get("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+
+
+def when_ready(server):
+    # Load and watch the data in the master after the first workers are
+    # forked. Forks then wait for the loads to finish, see app.loads
+    import app
+
+    forked = itertools.count(1)
+
+    def started():
+        if next(forked) == server.num_workers:
+            app.start(reloaded=replace_workers)
+
+    os.register_at_fork(after_in_parent=started)
+
+
+def replace_workers():
+    # Called by the load thread. SIGHUP makes the master fork the new workers
+    # from its main loop, and stop the current ones once they finish their
+    # requests
+    os.kill(os.getpid(), signal.SIGHUP)
+
+
+def pre_fork(server, worker):
+    # Keep the garbage collector of the workers from writing to the objects
+    # loaded by the master, which would copy their memory pages
+    if hasattr(gc, "freeze"):
+        gc.freeze()
+
+
+def post_fork(server, worker):
+    # Threads do not survive the fork, tail the live feed in each worker
+    import app
+
+    app.start_feed()
@@ -0,0 +1,86 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import utils.acwr as acwr
+
+
+def make_loads(days, players, seed=0):
+    rng = np.random.default_rng(seed)
+    values = rng.integers(0, 500, (days, len(players))).astype(float)
+    # rest days
+    values[rng.random(values.shape) < 0.3] = 0.
+    return pd.DataFrame(values,
+                        index=pd.date_range("2020-01-01", periods=days),
+                        columns=pd.Index(players))
+
+
+def assert_same_ratios(ratios, expected):
+    pd.testing.assert_frame_equal(ratios.loads, expected.loads)
+    pd.testing.assert_frame_equal(ratios.rolling, expected.rolling)
+    pd.testing.assert_frame_equal(ratios.ewma, expected.ewma)
+
+
+def full(loads):
+    return acwr.Workload().update(loads)
+
+
+@pytest.mark.parametrize("days", [1, 5, 40])
+def test_new_days_give_the_full_ratios(days):
+    loads = make_loads(90, ["JA001", "JA002", "JA003"])
+    workload = acwr.Workload()
+    workload.update(loads.iloc[:-days])
+
+    assert_same_ratios(workload.update(loads), full(loads))
+
+
+def test_changed_day_gives_the_full_ratios():
+    loads = make_loads(90, ["JA001", "JA002"])
+    workload = acwr.Workload()
+    workload.update(loads)
+
+    changed = loads.copy()
+    changed.iloc[50, 1] += 100.
+    assert_same_ratios(workload.update(changed), full(changed))
+    # and back
+    assert_same_ratios(workload.update(loads), full(loads))
+
+
+def test_new_player_gives_the_full_ratios():
+    loads = make_loads(90, ["JA001", "JA002", "JA003"])
+    before = loads[["JA001", "JA003"]].iloc[:60]
+    # the new player's loads start after the previous update
+    loads.iloc[:60, 1] = 0.
+    workload = acwr.Workload()
+    workload.update(before)
+
+    assert_same_ratios(workload.update(loads), full(loads))
+
+
+def test_removed_player_gives_the_full_ratios():
+    loads = make_loads(90, ["JA001", "JA002", "JA003"])
+    workload = acwr.Workload()
+    workload.update(loads)
+
+    fewer = loads[["JA001", "JA003"]]
+    assert_same_ratios(workload.update(fewer), full(fewer))
+
+
+def test_full_ratios_match_pandas_windows():
+    loads = make_loads(60, ["JA001", "JA002"])
+    ratios = full(loads)
+
+    acute = loads.rolling(acwr.ACUTE, min_periods=1).sum() / acwr.ACUTE
+    chronic = loads.rolling(acwr.CHRONIC, min_periods=1).mean()
+    rolling = (acute / chronic).where(chronic > 0)
+    rolling.iloc[:acwr.ACUTE - 1] = np.nan
+    pd.testing.assert_frame_equal(ratios.rolling, rolling)
+
+    # the recursions start from 0, not from the first load
+    seeded = pd.concat([loads.iloc[:1] * 0, loads])
+    acute, chronic = (seeded.ewm(alpha=2 / (window + 1),
+                                 adjust=False).mean().iloc[1:]
+                      for window in [acwr.ACUTE, acwr.CHRONIC])
+    ewma = (acute / chronic).where(chronic > 0)
+    ewma.iloc[:acwr.ACUTE - 1] = np.nan
+    pd.testing.assert_frame_equal(ratios.ewma, ewma, check_freq=False)
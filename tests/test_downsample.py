@@ -0,0 +1,72 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import utils.downsample as downsample
+
+
+def make_trace(n, seed=0):
+    rng = np.random.default_rng(seed)
+    x = pd.date_range("2020-01-01", periods=n, freq="D")
+    return x, pd.Series(rng.normal(0, 1, n).cumsum(), index=x)
+
+
+@pytest.mark.parametrize("method", list(downsample.METHODS))
+@pytest.mark.parametrize("n", [10, 107, 1000, 5000])
+@pytest.mark.parametrize("columns", [4, 8, 12])
+def test_endpoints_kept_within_budget(method, n, columns):
+    x, y = make_trace(n)
+    threshold = downsample.budget(columns)
+    kept_x, kept_y = downsample.downsample(x, y, threshold, method)
+
+    assert len(kept_x) == len(kept_y)
+    if n > threshold:
+        assert len(kept_x) <= threshold
+    else:
+        assert len(kept_x) == n
+    assert kept_x[0] == x[0] and kept_x[-1] == x[-1]
+    assert kept_y.iloc[0] == y.iloc[0] and kept_y.iloc[-1] == y.iloc[-1]
+    assert kept_x.is_monotonic_increasing and kept_x.is_unique
+    # the points kept are points of the trace
+    assert (y[kept_x] == kept_y).all()
+
+
+@pytest.mark.parametrize("method", list(downsample.METHODS))
+def test_positions_within_threshold(method):
+    x, y = make_trace(1000)
+    for threshold in [1, 2, 3, 4, 5, 50, 999, 1000, 2000]:
+        kept = downsample.METHODS[method](downsample._numeric(x), y.values,
+                                          threshold)
+        assert kept[0] == 0 and kept[-1] == len(x) - 1
+        assert len(kept) <= threshold or len(kept) == len(x)
+        assert (np.diff(kept) > 0).all()
+
+
+def test_lttb_keeps_a_spike():
+    x, y = make_trace(1000)
+    y.iloc[500] = 100.
+    kept_x, kept_y = downsample.downsample(x, y, 50, "lttb")
+    assert kept_y.max() == 100.
+
+
+def test_minmax_keeps_the_extremes():
+    x, y = make_trace(1000)
+    kept_x, kept_y = downsample.downsample(x, y, 50, "minmax")
+    assert kept_y.max() == y.max() and kept_y.min() == y.min()
+
+
+def test_missing_values_dropped_when_reduced():
+    x, y = make_trace(1000)
+    y.iloc[::3] = np.nan
+    kept_x, kept_y = downsample.downsample(x, y, 50)
+    assert kept_y.notna().all() and len(kept_y) <= 50
+
+    short_x, short_y = downsample.downsample(x[:20], y.iloc[:20], 50)
+    assert short_x.equals(x[:20])
+    assert short_y.isna().sum() == y.iloc[:20].isna().sum()
+
+
+def test_every_point_without_method():
+    x, y = make_trace(1000)
+    kept_x, kept_y = downsample.downsample(x, y, 50, None)
+    assert len(kept_x) == 1000
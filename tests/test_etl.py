@@ -0,0 +1,226 @@
+import datetime as dt
+import logging
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import utils.etl as etl
+
+
+def write_workbook(f, dates):
+    pd.DataFrame(
+        dict(Nom="JA001",
+             Date=dates,
+             RpePhyAv=3,
+             RpePhyAp=6,
+             RpeMenAv=2,
+             RpeMenAp=4,
+             RpeCoach=5)).to_excel(f, index=False)
+
+
+def test_touched_workbook_keeps_its_months(tmp_path):
+    (tmp_path / "RPE").mkdir()
+    workbook = tmp_path / "RPE" / "20200122.xlsx"
+    write_workbook(workbook, ["22/01/2020", "05/02/2020"])
+    before = etl.load_cached(tmp_path, "RPE", save=False)
+
+    # same bytes, new mtime, as after touch or a copy without -t
+    stat = workbook.stat()
+    os.utime(workbook, (stat.st_atime, stat.st_mtime + 60))
+    after = etl.load_cached(tmp_path, "RPE", save=False)
+    again = etl.load_cached(tmp_path, "RPE", save=False)
+
+    pd.testing.assert_frame_equal(after, before)
+    pd.testing.assert_frame_equal(again, before)
+    manifest = etl._read_manifest(tmp_path / etl.CACHE_FOLDER /
+                                  "RPE.manifest.json")
+    assert manifest["files"]["20200122.xlsx"]["months"] == [
+        "2020-01", "2020-02"
+    ]
+
+
+def test_lost_partition_is_written_again(tmp_path):
+    (tmp_path / "RPE").mkdir()
+    write_workbook(tmp_path / "RPE" / "20200122.xlsx",
+                   ["22/01/2020", "05/02/2020"])
+    write_workbook(tmp_path / "RPE" / "20200301.xlsx", ["01/03/2020"])
+    before = etl.load_cached(tmp_path, "RPE", save=False)
+
+    partitions = tmp_path / etl.CACHE_FOLDER / "RPE"
+    etl._partition(partitions, "2020-02").unlink()
+    after = etl.load_cached(tmp_path, "RPE", save=False)
+    again = etl.load_cached(tmp_path, "RPE", save=False)
+
+    pd.testing.assert_frame_equal(after, before)
+    pd.testing.assert_frame_equal(again, before)
+    assert etl._partition(partitions, "2020-02").exists()
+
+
+def test_changed_partition_is_written_again(tmp_path):
+    (tmp_path / "RPE").mkdir()
+    write_workbook(tmp_path / "RPE" / "20200122.xlsx", ["22/01/2020"])
+    write_workbook(tmp_path / "RPE" / "20200205.xlsx", ["05/02/2020"])
+    before = etl.load_cached(tmp_path, "RPE", save=False)
+
+    # e.g. truncated, or replaced by the partition of another month
+    partitions = tmp_path / etl.CACHE_FOLDER / "RPE"
+    etl._partition(partitions, "2020-02").write_bytes(b"")
+    after = etl.load_cached(tmp_path, "RPE", save=False)
+
+    pd.testing.assert_frame_equal(after, before)
+
+
+@pytest.mark.parametrize("values,expected", [
+    ([dt.time(0, 1, 30), dt.time(1, 0, 0)], [90, 3600]),
+    ([dt.timedelta(minutes=1, seconds=30),
+      np.timedelta64(45, "s")], [90, 45]),
+    (pd.to_timedelta(["00:01:30", "00:00:45"]), [90, 45]),
+    (["1:30", " 01:00:05 ", "45"], [90, 3605, 45]),
+    ([90, 45.5], [90, 45.5]),
+    (np.array([90, 45]), [90, 45]),
+    ([dt.time(0, 1, 30), "0:45", 12,
+      dt.timedelta(seconds=3)], [90, 45, 12, 3]),
+])
+def test_durations_of_every_kind(values, expected):
+    seconds = etl.to_seconds(pd.Series(values, name="LapTime"))
+    assert seconds.tolist() == expected
+
+
+def test_whole_durations_are_integers():
+    assert etl.to_seconds(pd.Series(["1:30", 45.0])).dtype == np.int64
+    assert etl.to_seconds(pd.Series([dt.time(0, 0, 1,
+                                             500000)])).dtype == np.float64
+
+
+def test_durations_in_days():
+    # 00:01:30 stored as a fraction of a day
+    seconds = etl.to_seconds(pd.Series([90 / 86400, 0.5]), unit=86400)
+    assert seconds.tolist() == [90, 43200]
+
+
+def test_malformed_durations_are_reported(caplog):
+    values = pd.Series(["1:30", "abc", "1:2:3:4", "-0:30", True, None, 45],
+                       name="LapTime")
+    with caplog.at_level(logging.WARNING, logger=etl.logger.name):
+        seconds = etl.to_seconds(values)
+
+    assert seconds.iloc[[0, 6]].tolist() == [90, 45]
+    assert seconds.iloc[1:6].isna().all()
+    assert "LapTime: 4 malformed duration(s)" in caplog.text
+    assert "'abc'" in caplog.text
+
+
+def masked(frame, timeframe, population):
+    """Subset of the boolean masks Dataset replaced"""
+    upper = frame.Date.max()
+    lower = upper - dt.timedelta(days=timeframe)
+
+    mask = (frame.Date <= upper) & (frame.Date >= lower)
+
+    if population:
+        mask = mask & (frame.Position == population)
+    return frame[mask]
+
+
+@pytest.mark.parametrize("categorical", [False, True])
+@pytest.mark.parametrize("population", [None, "AV", "AR", "XX"])
+@pytest.mark.parametrize("timeframe", [0, 7, 31, 1000])
+def test_dataset_rows_match_the_masks(timeframe, population, categorical):
+    rng = np.random.default_rng(0)
+    n = 500
+    frame = pd.DataFrame(
+        dict(Id=np.arange(n),
+             Date=pd.Timestamp("2020-01-01") +
+             pd.to_timedelta(rng.integers(0, 60, n), unit="D"),
+             Position=rng.choice(["AV", "AR", None], n)))
+    frame.loc[rng.random(n) < 0.05, "Date"] = pd.NaT
+    if categorical:
+        frame.Position = frame.Position.astype("category")
+
+    rows = etl.Dataset(frame).select(timeframe, population)
+    expected = masked(frame, timeframe, population)
+
+    assert rows.Date.is_monotonic_increasing
+    assert sorted(rows.Id) == sorted(expected.Id)
+
+
+def test_empty_dataset_rows():
+    frame = pd.DataFrame(dict(Date=pd.to_datetime([]), Position=[]))
+    assert etl.Dataset(frame).rows(31, "AV") == slice(0, 0)
+
+
+def sessions(**columns):
+    rows = dict(Nom=[
+        "JA001", "JA002", None, "123", "JA005", "JA006", "JA007", "JA008",
+        "JA009"
+    ],
+                Date=["22/01/2020"] * 4 + [None] + ["22/01/2020"] * 4,
+                Fcmin=[60, 0, 60, 60, 60, 60, 150, 60, 60],
+                Fcmoy=[120, 0, 120, 120, 120, 120, 120, 120, 120],
+                Fcmax=[180, 0, 180, 180, 180, 260, 180, 180, 180],
+                Power=[50., 60., 50., 50., 50., 50., 50., 250., -5.])
+    rows.update(columns)
+    return pd.DataFrame(rows)
+
+
+def test_clean_rejects_each_check():
+    valid, rejected = etl.clean(sessions())
+
+    # missing rates are 0, power outliers are only cleared
+    assert valid.Nom.tolist() == ["JA001", "JA002", "JA008", "JA009"]
+    assert valid.Power.isna().tolist() == [False, False, True, True]
+    assert rejected[etl.REASON].tolist() == [
+        "name", "name", "date", "heart_rate", "heart_rate", "power", "power"
+    ]
+    assert rejected.Power.tolist()[-2:] == [250., -5.]
+
+
+def test_clean_reports_the_first_failed_check():
+    valid, rejected = etl.clean(sessions(Date=[None] * 9))
+    assert valid.empty
+    assert rejected[etl.REASON].tolist()[:2] == ["date", "date"]
+    assert rejected[etl.REASON].tolist()[2:4] == ["name", "name"]
+
+
+def test_clean_without_checked_columns():
+    X = pd.DataFrame(dict(Distance=[1., 2.]))
+    valid, rejected = etl.clean(X)
+    pd.testing.assert_frame_equal(valid, X)
+    assert rejected.empty and etl.REASON in rejected
+
+
+def write_sessions(f, **columns):
+    X = sessions(**columns)
+    X.Date = X.Date.fillna("")
+    X.to_excel(f, index=False)
+
+
+def test_rejected_rows_are_quarantined(tmp_path):
+    (tmp_path / "Seances").mkdir()
+    first = tmp_path / "Seances" / "20200122.xlsx"
+    second = tmp_path / "Seances" / "20200123.xlsx"
+    write_sessions(first)
+    write_sessions(second, Date=["23/01/2020"] * 9)
+    quarantine = tmp_path / etl.CACHE_FOLDER / "Seances.quarantine.csv"
+
+    X = etl.load_cached(tmp_path, "Seances", save=False)
+    assert len(X) == 9
+    kept = pd.read_csv(quarantine)
+    assert kept.groupby(etl.SOURCE).size().to_dict() == {
+        first.name: 7,
+        second.name: 6
+    }
+
+    # fixed, then left out
+    write_sessions(first, Nom=["JA00{}".format(i) for i in range(9)])
+    etl.load_cached(tmp_path, "Seances", save=False)
+    kept = pd.read_csv(quarantine)
+    assert kept.groupby(etl.SOURCE).size().to_dict() == {
+        first.name: 5,
+        second.name: 6
+    }
+    first.unlink()
+    etl.load_cached(tmp_path, "Seances", save=False)
+    assert set(pd.read_csv(quarantine)[etl.SOURCE]) == {second.name}
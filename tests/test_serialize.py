@@ -0,0 +1,25 @@
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import utils.serialize as serialize
+
+
+@pytest.mark.parametrize(
+    "dtype",
+    sorted(serialize.NUMPY_DTYPES, key=str) + [np.dtype("float16")])
+def test_arrays_are_encoded_as_lists(dtype):
+    values = np.array([0, 1, 1, 0, 1]).astype(dtype)
+
+    encoded = json.loads(serialize.dumps(dict(x=values, y=pd.Series(values))))
+
+    assert encoded == dict(x=values.tolist(), y=values.tolist())
+
+
+def test_missing_values_are_null():
+    values = np.array([1.5, np.nan, np.inf], dtype=np.float32)
+
+    assert json.loads(serialize.dumps(values)) == [1.5, None, None]
+    assert serialize.to_native(pd.Series(["a", None])) == ["a", None]
@@ -0,0 +1,28 @@
+import threading
+
+import utils.store as store
+
+
+def test_dropped_refresh_does_not_count_its_failures():
+    figure_store = store.FigureStore()
+    version = [1]
+    started, release = threading.Event(), threading.Event()
+
+    @figure_store.precomputed([0], failed="error")
+    def output(arg):
+        if version[0] == 1:
+            started.set()
+            release.wait()
+            raise ValueError("superseded")
+        return dict(version=version[0])
+
+    figure_store.refresh(1)
+    started.wait()
+    version[0] = 2
+    figure_store.rebuild(2)
+    release.set()
+    figure_store._pool.shutdown(wait=True)
+
+    assert figure_store.version() == 2
+    assert figure_store.status()["failed"] == 0
+    assert figure_store.served("output")(0) == dict(version=2)
@@ -0,0 +1,87 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import utils.etl as etl
+import utils.table as table
+
+COLUMNS = ["Id", "Date", "Nom", "Fcmax", "Distance"]
+
+
+def make_dataset(seed=0):
+    rng = np.random.default_rng(seed)
+    n = 300
+    frame = pd.DataFrame(
+        dict(Id=np.arange(n),
+             Date=pd.Timestamp("2020-01-01") +
+             pd.to_timedelta(rng.integers(0, 60, n), unit="D"),
+             Nom=rng.choice(["JA001", "JA002", "JB003", "JB004"], n),
+             Position=rng.choice(["AV", "AR"], n),
+             Fcmax=rng.integers(150, 200, n).astype(float),
+             Distance=rng.normal(5000, 1000, n).round()))
+    frame.loc[rng.random(n) < 0.1, "Fcmax"] = np.nan
+    return etl.Dataset(frame)
+
+
+def pandas_rows(dataset, timeframe, population, sort_by, filter_query):
+    """Rows of the DataTable examples, filtered and sorted by pandas"""
+    frame = dataset.select(timeframe, population)[COLUMNS]
+    for filter_part in filter_query.split(" && "):
+        name, operator, value = table.split_filter_part(filter_part)
+        if operator in ("eq", "ne", "lt", "le", "gt", "ge"):
+            frame = frame.loc[getattr(frame[name], operator)(value)]
+        elif operator == "contains":
+            frame = frame.loc[frame[name].str.contains(value)]
+    for s in sort_by:
+        frame = frame.sort_values(s["column_id"],
+                                  ascending=s["direction"] == "asc",
+                                  na_position="last")
+    return frame
+
+
+FILTERS = [
+    "", "{Fcmax} > 180", "{Fcmax} ge 180 && {Distance} lt 5000",
+    "{Nom} contains JA", "{Nom} = JB003", "{Fcmax} ne 170"
+]
+SORTS = [[], [dict(column_id="Fcmax", direction="asc")],
+         [dict(column_id="Distance", direction="desc")],
+         [dict(column_id="Nom", direction="desc")]]
+
+
+@pytest.mark.parametrize("filter_query", FILTERS)
+@pytest.mark.parametrize("sort_by", SORTS)
+@pytest.mark.parametrize("timeframe,population", [(31, None), (7, "AV"),
+                                                  (0, "AR")])
+def test_rows_match_pandas(timeframe, population, sort_by, filter_query):
+    dataset = make_dataset()
+    view = table.TableView(dataset, COLUMNS)
+
+    rows = view.frame.iloc[view.rows(timeframe, population, sort_by,
+                                     filter_query)]
+    expected = pandas_rows(dataset, timeframe, population, sort_by,
+                           filter_query)
+
+    assert sorted(rows.Id) == sorted(expected.Id)
+    if sort_by:
+        column = sort_by[0]["column_id"]
+        # ties may come in another order
+        pd.testing.assert_series_equal(rows[column].reset_index(drop=True),
+                                       expected[column].reset_index(drop=True))
+
+
+def test_pages_cover_the_rows():
+    view = table.TableView(make_dataset(), COLUMNS)
+    sort_by = [{"column_id": "Fcmax", "direction": "desc"}]
+    rows = view.rows(31, None, sort_by, "{Distance} > 4000")
+
+    records, pages = [], 0
+    while True:
+        page, count = view.page(31, None, sort_by, "{Distance} > 4000", pages,
+                                10)
+        if not page:
+            break
+        records += page
+        pages += 1
+
+    assert count == pages
+    assert [r["Id"] for r in records] == view.frame.Id.values[rows].tolist()
@@ -0,0 +1,112 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import utils.etl as etl
+import utils.totals as totals
+
+COLUMNS = ["Sprints", "Power"]
+
+
+def write_session(folder, date, sprints):
+    day, month, year = date.split("/")
+    pd.DataFrame(
+        dict(Nom=["JA001", "JA002", "JA001"],
+             Date=date,
+             Sprints=sprints,
+             Power=[40., np.nan, 60.])).to_excel(
+                 folder / "Seances" / "{}{}{}.xlsx".format(year, month, day),
+                 index=False)
+
+
+def assert_same_totals(got, expected):
+    assert list(got.days) == list(expected.days)
+    start, end = expected.days[0], expected.days[-1]
+    pd.testing.assert_frame_equal(got.sums(start, end),
+                                  expected.sums(start, end))
+    pd.testing.assert_frame_equal(got.means(start, end),
+                                  expected.means(start, end))
+
+
+def test_daily_sums_follow_the_partitions_rewritten(tmp_path):
+    (tmp_path / "Seances").mkdir()
+    write_session(tmp_path, "22/01/2020", [1, 2, 3])
+    write_session(tmp_path, "05/02/2020", [4, 5, 6])
+    sums = totals.DailySums(tmp_path, "Seances", COLUMNS)
+
+    def load():
+        etl.load_cached(tmp_path, "Seances", save=False, on_update=sums.update)
+        history = etl.load_cached(tmp_path, "Seances", save=False)
+        history.Date = pd.to_datetime(history.Date)
+        return totals.RangeTotals(history, COLUMNS)
+
+    expected = load()
+    assert_same_totals(sums.totals(), expected)
+
+    write_session(tmp_path, "05/02/2020", [7, 8, 9])
+    write_session(tmp_path, "02/03/2020", [1, 1, 1])
+    expected = load()
+    assert_same_totals(sums.totals(), expected)
+
+    # read from the files written, without the partitions
+    fresh = totals.DailySums(tmp_path, "Seances", COLUMNS)
+    etl.load_cached(tmp_path, "Seances", save=False, on_update=fresh.update)
+    assert_same_totals(fresh.totals(), sums.totals())
+
+
+def make_sessions(seed=0):
+    rng = np.random.default_rng(seed)
+    n = 400
+    frame = pd.DataFrame(
+        dict(Nom=rng.choice(["JA001", "JA002", "JA003", "JA004"], n),
+             Date=pd.Timestamp("2020-01-01") +
+             pd.to_timedelta(rng.integers(0, 90, n), unit="D") +
+             pd.to_timedelta(rng.integers(0, 20, n), unit="h"),
+             Sprints=rng.integers(0, 10, n).astype(float),
+             Power=rng.normal(50, 10, n)))
+    frame.loc[rng.random(n) < 0.2, "Power"] = np.nan
+    return frame
+
+
+GROUPS = pd.Series(["Avant", "Arriere", "Avant"],
+                   index=["JA001", "JA002", "JA003"])
+RANGES = [("2020-01-01", "2020-03-30"), ("2020-01-10", "2020-01-10"),
+          ("2020-02-03", "2020-02-20"), ("2019-12-01", "2020-01-05"),
+          ("2020-03-25", "2020-05-01"), ("2020-02-20", "2020-02-03")]
+
+
+@pytest.mark.parametrize("start,end", RANGES)
+def test_range_totals_match_a_groupby(start, end):
+    frame = make_sessions()
+    range_totals = totals.RangeTotals(frame, COLUMNS, GROUPS)
+
+    days = frame.Date.dt.normalize()
+    rows = frame[(days >= start) & (days <= end)]
+    players = sorted(frame.Nom.unique())
+    by_player = rows.groupby("Nom")[COLUMNS]
+    sums = by_player.sum().reindex(players, fill_value=0.)
+    counts = by_player.count().reindex(players, fill_value=0)
+    pd.testing.assert_frame_equal(range_totals.sums(start, end),
+                                  sums,
+                                  check_names=False)
+    pd.testing.assert_frame_equal(range_totals.means(start, end),
+                                  sums / counts.replace(0, np.nan),
+                                  check_names=False)
+
+    groups = sorted(GROUPS.unique())
+    by_group = rows[COLUMNS].groupby(rows.Nom.map(GROUPS))
+    group_sums = by_group.sum().reindex(groups, fill_value=0.)
+    group_counts = by_group.count().reindex(groups, fill_value=0)
+    pd.testing.assert_frame_equal(range_totals.group_sums(start, end),
+                                  group_sums,
+                                  check_names=False)
+    pd.testing.assert_frame_equal(range_totals.group_means(start, end),
+                                  group_sums / group_counts.replace(0, np.nan),
+                                  check_names=False)
+    active = rows[rows[COLUMNS].notna().any(axis=1)].Nom.unique()
+    pd.testing.assert_series_equal(
+        range_totals.group_players(start, end),
+        GROUPS[GROUPS.index.isin(active)].value_counts().reindex(groups,
+                                                                 fill_value=0),
+        check_names=False,
+        check_dtype=False)
@@ -0,0 +1,156 @@
+import collections
+import logging
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Window lengths, in days
+ACUTE = 7
+CHRONIC = 28
+
+Ratios = collections.namedtuple("Ratios", ["loads", "rolling", "ewma"])
+
+
+def daily_loads(rpe, seances, kind):
+    """Training load of each player on each day, 0 on rest days
+    
+    Arguments:
+        rpe {DataFrame} -- RPE dataset
+        seances {DataFrame} -- Seances dataset
+        kind {str} -- "SRPE", physical RPE times session minutes, or
+                      "DISTANCE", meters run
+    
+    Returns:
+        [DataFrame] -- loads, one row per day and one column per player
+    """
+    sessions = seances.groupby(["Nom", "Date"], observed=True)
+    if kind == "SRPE":
+        minutes = sessions.LapTime.sum() / 60
+        rpe = rpe.groupby(["Nom", "Date"], observed=True).RpePhyAp.mean()
+        loads = (rpe * minutes).dropna()
+    else:
+        loads = sessions.Distance.sum()
+
+    loads = loads.astype(float).unstack("Nom", fill_value=0.)
+    loads.columns = loads.columns.astype(str)
+    if loads.empty:
+        return loads
+
+    days = pd.date_range(loads.index.min(), loads.index.max(), freq="D")
+    return loads.reindex(days, fill_value=0.)
+
+
+def _ewma(values, alpha, seed):
+    """Exponentially weighted averages of each column, continued from seed"""
+    frame = pd.DataFrame(np.vstack([seed, values]))
+    return frame.ewm(alpha=alpha, adjust=False).mean().values[1:]
+
+
+class Workload:
+    """Acute:chronic workload ratios of every player, updated incrementally
+    
+    The rolling averages are kept as running sums of the loads, and the
+    exponentially weighted averages as their last values, so the recursions
+    only run over the new days. Past days are recomputed from the first day whose
+    loads changed. Each update returns new frames, so the ratios handed out
+    before are left untouched.
+    
+    Keyword Arguments:
+        acute {int} -- acute window, in days (default: {ACUTE})
+        chronic {int} -- chronic window, in days (default: {CHRONIC})
+    """
+
+    def __init__(self, acute=ACUTE, chronic=CHRONIC):
+        self.acute = acute
+        self.chronic = chronic
+        self.days = pd.DatetimeIndex([])
+        self.players = pd.Index([])
+        self._loads = np.zeros((0, 0))
+        self._sums = np.zeros((0, 0))
+        self._ewma = np.zeros((0, 2, 0))
+
+    def _first_change(self, loads):
+        """First day to recompute, 0 to recompute everything"""
+        if (not len(self.days) or loads.index[0] != self.days[0] or
+                not self.players.isin(loads.columns).all()):
+            return 0
+
+        # loads of the players added since were 0
+        previous = np.zeros((len(self.days), len(loads.columns)))
+        previous[:, loads.columns.get_indexer(self.players)] = self._loads
+
+        overlap = min(len(loads), len(self.days))
+        changed = np.flatnonzero((loads.values[:overlap]
+                                  != previous[:overlap]).any(axis=1))
+        if len(changed):
+            return int(changed[0])
+        return overlap
+
+    def update(self, loads):
+        """Ratios with the latest loads
+        
+        Arguments:
+            loads {DataFrame} -- daily loads, from daily_loads
+        
+        Returns:
+            [Ratios] -- daily loads, rolling and EWMA ratios, one row per day
+                        and one column per player
+        """
+        if loads.empty:
+            return Ratios(loads, loads, loads)
+
+        start = self._first_change(loads)
+
+        # state of the day before start, for the current players
+        known = self.players.get_indexer(loads.columns)
+        sums = np.zeros((start, len(loads.columns)))
+        ewma = np.zeros((start, 2, len(loads.columns)))
+        if start:
+            sums[:, known >= 0] = self._sums[:start, known[known >= 0]]
+            ewma[:, :, known >= 0] = self._ewma[:start, :, known[known >= 0]]
+
+        values = loads.values[start:]
+        seed = sums[-1] if start else np.zeros(len(loads.columns))
+        sums = np.vstack([sums, seed + values.cumsum(axis=0)])
+
+        seed = ewma[-1] if start else np.zeros((2, len(loads.columns)))
+        ewma = np.concatenate([
+            ewma,
+            np.stack([
+                _ewma(values, 2 / (window + 1), seed[i])
+                for i, window in enumerate([self.acute, self.chronic])
+            ],
+                     axis=1)
+        ])
+
+        logger.info("ACWR: %d of %d days computed, %d players",
+                    len(loads) - start, len(loads), len(loads.columns))
+
+        self.days = loads.index
+        self.players = loads.columns
+        self._loads = loads.values.copy()
+        self._sums = sums
+        self._ewma = ewma
+
+        return Ratios(loads, self._ratios(*self._rolling(sums)),
+                      self._ratios(ewma[:, 0], ewma[:, 1]))
+
+    def _rolling(self, sums):
+        """Rolling averages, the chronic one over the history available"""
+        n = len(sums)
+        padded = np.vstack([np.zeros((self.chronic, sums.shape[1])), sums])
+        days = np.minimum(np.arange(1, n + 1), self.chronic)[:, None]
+
+        acute = (sums - padded[self.chronic - self.acute:][:n]) / self.acute
+        chronic = (sums - padded[:n]) / days
+
+        return acute, chronic
+
+    def _ratios(self, acute, chronic):
+        """Acute:chronic ratios, from the end of the first acute window"""
+        with np.errstate(divide="ignore", invalid="ignore"):
+            ratios = np.where(chronic > 0, acute / chronic, np.nan)
+        ratios[:self.acute - 1] = np.nan
+        return pd.DataFrame(ratios, index=self.days, columns=self.players)
@@ -0,0 +1,65 @@
+import hashlib
+
+import flask
+
+# Dash adds the modification time of the assets to their urls, ?m=...
+ASSET_MAX_AGE = 365 * 24 * 3600
+# Assets linked without it, e.g. images, are cached for a day
+UNVERSIONED_MAX_AGE = 24 * 3600
+
+# GET responses of Dash built from the code, fetched again by every page
+# load, e.g. /_dash-layout and /_dash-dependencies
+TAGGED = ("_dash-layout", "_dash-dependencies")
+
+
+def etag(body):
+    """Tag of a response, from its body
+    
+    Arguments:
+        body {bytes} -- response body
+    
+    Returns:
+        [str] -- tag
+    """
+    return hashlib.sha1(body).hexdigest()
+
+
+def init_app(server, assets_path="/assets/"):
+    """Conditional requests of the layout, and long-lived caching of the
+    assets
+    
+    The layout and dependencies are tagged from their body, so a page load
+    repeated with If-None-Match gets a 304 without the body. The tags are
+    weak, as Flask-Compress encodes the bodies after. Assets are already
+    tagged by Flask, and are cached by browsers. Callback requests are
+    POSTs, which browsers never send conditionally, and are left as is.
+    
+    Arguments:
+        server {Flask} -- Dash server
+    
+    Keyword Arguments:
+        assets_path {str} -- url of the assets (default: {"/assets/"})
+    """
+
+    @server.after_request
+    def cache_headers(response):
+        request = flask.request
+        path = request.path
+        if request.method != "GET":
+            return response
+
+        if path.endswith(TAGGED) and response.status_code == 200:
+            response.set_etag(etag(response.get_data()), weak=True)
+            # stored, but checked with the server before each use
+            response.headers["Cache-Control"] = "no-cache"
+            response.make_conditional(request)
+        elif path.startswith(assets_path) and response.status_code in (200,
+                                                                       304):
+            if "m" in request.args:
+                response.headers["Cache-Control"] = (
+                    "public, max-age={}, immutable".format(ASSET_MAX_AGE))
+            else:
+                response.headers["Cache-Control"] = "public, max-age={}".format(
+                    UNVERSIONED_MAX_AGE)
+
+        return response
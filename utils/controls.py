@@ -9,6 +9,15 @@ TIME_FRAME_NAMES = dict(SHORT="Dernier Entraînement",
 # POPULATION
 POPULATION = dict(ALL="Tout", AV="Avants", AR="Arrières")
 
+# Training load
+LOADS = dict(SRPE="RPE x Durée", DISTANCE="Distance")
+
+# Totals over a date range
+TOTALS = dict(DPZV="Distances par Zones de Vitesse",
+              TZFC="Temps par Zones de FC",
+              Sprints="Sprints",
+              Power="Puissance Moyenne")
+
 # DPZV
 DPZV = dict(DPZV0e6="0-6km/h",
             DPZV6e14="6-14km/h",
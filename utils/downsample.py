@@ -0,0 +1,127 @@
+import numpy as np
+
+# Graphs are laid out on a 12 columns grid, budgets are computed for the
+# sideline tablets, in landscape
+SCREEN_WIDTH = 1280
+PIXELS_PER_POINT = 3
+
+
+def budget(columns, width=SCREEN_WIDTH, pixels=PIXELS_PER_POINT):
+    """Number of points a graph can show distinctly
+    
+    Arguments:
+        columns {int} -- width of the graph, in grid columns
+    
+    Keyword Arguments:
+        width {int} -- screen width, in pixels (default: {SCREEN_WIDTH})
+        pixels {int} -- pixels per point (default: {PIXELS_PER_POINT})
+    
+    Returns:
+        [int] -- point budget
+    """
+    return int(width * columns / 12 / pixels)
+
+
+def _numeric(x):
+    x = np.asarray(x)
+    if x.dtype.kind == "M":
+        x = x.astype("datetime64[ns]").view("int64")
+    return x.astype(float)
+
+
+def lttb(x, y, threshold):
+    """Largest-Triangle-Three-Buckets, keeps the shape of a line
+    
+    The first and last points are kept, and the points in between are split
+    in threshold - 2 buckets. In each bucket, the point forming the largest
+    triangle with the point kept in the previous bucket and the average of
+    the next bucket is kept.
+    
+    Arguments:
+        x {array} -- abscissas, sorted
+        y {array} -- ordinates
+        threshold {int} -- number of points kept
+    
+    Returns:
+        [array] -- positions of the points kept
+    """
+    n = len(y)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    edges = (np.arange(threshold - 1) * (n - 2) / (threshold - 2)).astype(int)
+    edges += 1
+    edges[-1] = n - 1
+
+    kept = np.empty(threshold, dtype=np.int64)
+    kept[0], kept[-1] = 0, n - 1
+
+    a = 0
+    for i in range(threshold - 2):
+        start, stop = edges[i], edges[i + 1]
+        if i + 2 < len(edges):
+            following = slice(edges[i + 1], edges[i + 2])
+        else:
+            following = slice(n - 1, n)
+        xc, yc = x[following].mean(), y[following].mean()
+
+        areas = np.abs((x[a] - xc) * (y[start:stop] - y[a]) -
+                       (x[a] - x[start:stop]) * (yc - y[a]))
+        a = start + int(areas.argmax())
+        kept[i + 1] = a
+
+    return kept
+
+
+def minmax(x, y, threshold):
+    """Minimum and maximum of each bucket, keeps the peaks of a line
+    
+    Arguments:
+        x {array} -- abscissas, sorted
+        y {array} -- ordinates
+        threshold {int} -- maximum number of points kept
+    
+    Returns:
+        [array] -- positions of the points kept
+    """
+    n = len(y)
+    count = (threshold - 2) // 2
+    if threshold >= n or count < 1:
+        return np.arange(n)
+
+    buckets = np.arange(n) * count // n
+    order = np.lexsort((y, buckets))
+    starts = np.searchsorted(buckets, np.arange(count))
+    ends = np.append(starts[1:], n) - 1
+
+    return np.unique(np.concatenate([[0, n - 1], order[starts], order[ends]]))
+
+
+METHODS = dict(lttb=lttb, minmax=minmax)
+
+
+def downsample(x, y, threshold, method="lttb"):
+    """Points of a trace, reduced to a budget
+    
+    Missing values are dropped when the trace is reduced, the trace is
+    returned as is when it fits the budget.
+    
+    Arguments:
+        x {Index} -- abscissas, sorted
+        y {Series} -- ordinates
+        threshold {int} -- point budget
+    
+    Keyword Arguments:
+        method {str} -- "lttb", "minmax", or None to keep every point
+                        (default: {"lttb"})
+    
+    Returns:
+        [tuple] -- abscissas and ordinates kept
+    """
+    values = np.asarray(y, dtype=float)
+    valid = np.flatnonzero(np.isfinite(values))
+    if method is None or len(valid) <= threshold:
+        return x, y
+
+    keep = valid[METHODS[method](_numeric(x)[valid], values[valid], threshold)]
+    return x[keep], y.iloc[keep]
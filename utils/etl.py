@@ -1,10 +1,105 @@
+import contextlib
 import datetime as dt
-import functools
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
 import numpy as np
 import pandas as pd
 
+import utils.metrics as metrics
+
+try:
+    import fcntl
+except ImportError:  # Windows, the cache is then updated without a lock
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Ingest cache, stored next to the processed csv files, one partition per
+# month in a folder per season: _processed/Seances/2019-2020/2020-01.parquet
+CACHE_FOLDER = "_processed"
+SOURCE = "_source"
+# Bumped when parsing or cleaning changes, to parse every file again
+INGEST_VERSION = 4
+# Month the seasons start
+SEASON_START = 9
+
+# Team of the datasets stored directly in the data folder, other teams have
+# a sub-folder each, e.g. data/Espoirs/Seances
+DEFAULT_TEAM = "ASRUC"
+
+# Rows failing the checks of clean are kept aside, with the failed check
+REASON = "_reason"
+HEART_RATES = ["Fcmin", "Fcmoy", "Fcmax"]
+HEART_RATE_RANGE = (0, 250)
+POWER_RANGE = (0, 200)
+
+# In-memory schema, see compact: text keys stored as categoricals, and
+# ingest artifacts dropped after load
+CATEGORIES = ["Nom", "Position"]
+DEAD_COLUMNS = ["index"]
+
+# Seconds per unit of the numbers found in duration columns, Excel types
+# durations as fractions of a day
+DURATIONS = dict(seconds=1, days=86400)
+
+# Columns read from the workbooks of each dataset, with their type: "text",
+# "number", "date", or a unit of DURATIONS for durations stored in seconds.
+# Other columns are not read, see read_workbook
+SCHEMAS = dict(RPE=OrderedDict([("Nom", "text"), ("Date", "date"),
+                                ("RpePhyAv", "number"), ("RpePhyAp", "number"),
+                                ("RpeMenAv", "number"), ("RpeMenAp", "number"),
+                                ("RpeCoach", "number")]),
+               Seances=OrderedDict([
+                   ("Nom", "text"), ("Date", "date"), ("LapTime", "seconds"),
+                   ("Distance", "number"), ("mmin", "number"),
+                   ("Vmoy", "number"), ("Vmax", "number"), ("Fcmoy", "number"),
+                   ("Fcmin", "number"), ("Fcmax", "number"),
+                   ("DPZV0e6", "number"), ("DPZV6e14", "number"),
+                   ("DPZV14e19", "number"), ("DPZV19e24", "number"),
+                   ("DPZV24e40", "number"), ("Tzfc0e70", "days"),
+                   ("Tzfc70e110", "days"), ("Tzfc110e150", "days"),
+                   ("Tzfc150e180", "days"), ("Tzfc180e250", "days"),
+                   ("Sprints", "number"), ("RrHfMoy", "number"),
+                   ("RrBfMoy", "number"), ("HfBfMoy", "number"),
+                   ("Power", "number")
+               ]))
+
+
+def teams(data_path, dataset_names):
+    """Find the team folders of a data folder
+    
+    Arguments:
+        data_path {str} -- data path
+        dataset_names {list} -- directories containing xlsx files
+    
+    Returns:
+        [OrderedDict] -- folder of each team, DEFAULT_TEAM first
+    """
+    p = Path(data_path)
+
+    def holds_data(folder):
+        return any((folder / name).is_dir() for name in dataset_names)
+
+    found = OrderedDict()
+    if holds_data(p):
+        found[DEFAULT_TEAM] = p
+    for folder in sorted(p.iterdir()):
+        if (folder.is_dir() and
+                folder.name not in dataset_names + [CACHE_FOLDER] and
+                holds_data(folder)):
+            found[folder.name] = folder
+
+    return found
+
 
 def resolve(path, directory):
     """Get all xlsx files
@@ -20,21 +115,253 @@ def resolve(path, directory):
     return p.glob("*.xlsx")
 
 
-def hhmmss_to_seconds(hh_mm_ss):
-    """Convert time
+def _split_seconds(text):
+    """Convert "[hh:]mm:ss" strings to seconds, NaN for other strings, e.g.
+    with more fields or a sign"""
+    text = text.str.strip()
+    parts = text.str.split(":", expand=True).apply(pd.to_numeric,
+                                                   errors="coerce")
+    count = text.str.count(":") + 1
+
+    seconds = pd.Series(0., index=text.index)
+    for i in parts.columns:
+        weight = (60.**(count - 1 - i)).where(count > i, 0)
+        seconds += parts[i].where(count > i, 0) * weight
+
+    return seconds.where((count <= 3) & ~text.str.contains("[+-]"))
+
+
+def _scale(numbers, unit):
+    """Numbers of a unit in seconds, rounded to the microsecond so that
+    whole seconds stored as fractions of a day stay whole"""
+    if unit == 1:
+        return numbers
+    return (numbers * unit).round(6)
+
+
+def to_seconds(values, unit=1):
+    """Convert durations to seconds, in one pass over the column
+    
+    Handles datetime.time, timedelta, "[hh:]mm:ss" strings and numbers,
+    the latter being counted in unit seconds. Values are dispatched on their
+    type once, then each kind is converted in bulk. Malformed values are
+    reported and set to NaN.
+    
+    Arguments:
+        values {Series} -- durations
+    
+    Keyword Arguments:
+        unit {float} -- seconds per unit of the numbers, e.g. 86400 for
+                        fractions of a day (default: {1})
+    
+    Returns:
+        [Series] -- durations in seconds, as integers when possible
+    """
+    if pd.api.types.is_timedelta64_dtype(values):
+        seconds = values.dt.total_seconds()
+    elif pd.api.types.is_numeric_dtype(values):
+        seconds = _scale(values.astype(float), unit)
+    else:
+        kind = values.map(type)
+        types = set(kind.unique())
+        seconds = pd.Series(np.nan, index=values.index)
+
+        def select(*classes):
+            matching = [
+                t for t in types if issubclass(t, classes) and t is not bool
+            ]
+            if not matching:
+                return None
+            if len(matching) == len(types):
+                return slice(None)
+            return kind.isin(matching).values
+
+        is_time = select(dt.time)
+        if is_time is not None:
+            # datetime.time has no vectorized accessor, use its fields
+            seconds[is_time] = np.fromiter(
+                (t.hour * 3600 + t.minute * 60 + t.second + t.microsecond / 1e6
+                 for t in values[is_time]),
+                dtype=float)
+
+        is_delta = select(dt.timedelta, np.timedelta64)
+        if is_delta is not None:
+            seconds[is_delta] = pd.to_timedelta(
+                values[is_delta]).dt.total_seconds()
+
+        is_number = select(int, float, np.number)
+        if is_number is not None:
+            seconds[is_number] = _scale(values[is_number].astype(float), unit)
+
+        is_text = select(str)
+        if is_text is not None:
+            seconds[is_text] = _split_seconds(values[is_text])
+
+    malformed = seconds.isna() & values.notna()
+    if malformed.any():
+        logger.warning("%s: %d malformed duration(s), e.g. %r", values.name,
+                       malformed.sum(), values[malformed].iloc[:3].tolist())
+
+    whole = np.floor(seconds.values) == seconds.values
+    if whole.all():
+        return seconds.astype(np.int64)
+
+    return seconds
+
+
+def enforce(X, schema):
+    """Project a workbook on a schema, and convert its columns
+    
+    Columns missing from the workbook are added empty, so that every file
+    of a dataset has the same columns. Text stays text, with numbers typed
+    in it turned to strings, dates are parsed day first, as in the exports.
+    Malformed values are reported and set to NaN.
     
     Arguments:
-        hh_mm_ss {DateTime} -- original datetime
+        X {DataFrame} -- workbook
+        schema {dict} -- type of each column, see SCHEMAS
     
     Returns:
-        [str] -- Time in seconds
+        [DataFrame] -- columns of the schema, in its order
     """
-    hh_mm_ss = str(hh_mm_ss)
-    return functools.reduce(lambda acc, x: acc * 60 + x,
-                            map(int, hh_mm_ss.split(':')))
+    X = X.reindex(columns=list(schema))
+    for col, kind in schema.items():
+        values = X[col]
+        if kind == "text":
+            X[col] = values.where(values.isna(), values.astype(str))
+            continue
+        if kind in DURATIONS:
+            X[col] = to_seconds(values, DURATIONS[kind])
+            continue
+
+        if kind == "date":
+            X[col] = pd.to_datetime(values, errors="coerce", dayfirst=True)
+        else:
+            X[col] = pd.to_numeric(values, errors="coerce")
+
+        malformed = X[col].isna() & values.notna()
+        if malformed.any():
+            logger.warning("%s: %d malformed %s(s), e.g. %r", col,
+                           malformed.sum(), kind,
+                           values[malformed].iloc[:3].tolist())
+
+    return X
+
+
+def read_workbook(f, schema=None):
+    """Read a single xlsx file
+    
+    Arguments:
+        f {Pathlib path} -- xlsx file
+    
+    Keyword Arguments:
+        schema {dict} -- only read these columns, and convert them, see
+                         SCHEMAS (default: {None}, every column as is)
+    
+    Returns:
+        [dataframe] -- file content
+    """
+    if schema is None:
+        X = pd.read_excel(f)
+        if "LapTime" in X:
+            X["LapTime"] = to_seconds(X.LapTime)
+        return X
+
+    return enforce(pd.read_excel(f, usecols=lambda col: col in schema), schema)
 
 
-def concat(files, save=True, name=None):
+def clean(X):
+    """Validate the rows of a workbook, and split off the rejected ones
+    
+    Rows with a missing or numeric name, a missing date, or heart rates
+    out of range or out of order (0 is a missing rate) are rejected. Power
+    outliers are only cleared, the rest of their row being valid, and a
+    copy of the row is kept aside.
+    
+    Arguments:
+        X {DataFrame} -- workbook
+    
+    Returns:
+        [tuple] -- valid rows, and rows kept aside with the failed check
+                   in REASON
+    """
+    checks = OrderedDict()
+    if "Nom" in X:
+        checks["name"] = (X.Nom.isna() |
+                          pd.to_numeric(X.Nom, errors="coerce").notna())
+    if "Date" in X:
+        checks["date"] = pd.to_datetime(X.Date, errors="coerce").isna()
+    if set(HEART_RATES) <= set(X):
+        rates = X[HEART_RATES].apply(pd.to_numeric, errors="coerce")
+        low, high = HEART_RATE_RANGE
+        recorded = (rates > 0).all(axis=1)
+        checks["heart_rate"] = (((rates < low) | (rates > high)).any(axis=1) |
+                                (recorded & ((rates.Fcmin > rates.Fcmoy) |
+                                             (rates.Fcmoy > rates.Fcmax))))
+    if "Power" in X:
+        power = pd.to_numeric(X.Power, errors="coerce")
+        checks["power"] = (power < POWER_RANGE[0]) | (power >= POWER_RANGE[1])
+
+    if not checks:
+        return X, X.iloc[:0].assign(**{REASON: ""})
+
+    reason = pd.Series(np.select(list(checks.values()), list(checks), ""),
+                       index=X.index)
+    rejected = X[reason != ""].assign(**{REASON: reason[reason != ""]})
+
+    X = X[(reason == "") | (reason == "power")].copy()
+    if "power" in checks:
+        X.loc[reason[X.index] == "power", "Power"] = np.nan
+
+    return X, rejected
+
+
+def _log_rejected(rejected, source):
+    if len(rejected):
+        logger.warning(
+            "%s: %d row(s) kept aside (%s)", source, len(rejected), ", ".join(
+                "{} {}".format(count, reason)
+                for reason, count in rejected[REASON].value_counts().items()))
+
+
+def _timed_read(f, schema=None):
+    start = time.perf_counter()
+    X = read_workbook(f, schema)
+    return X, time.perf_counter() - start
+
+
+def read_workbooks(files, workers=1, schema=None):
+    """Read xlsx files, in parallel processes if asked to
+    
+    Arguments:
+        files {list} -- xlsx files
+    
+    Keyword Arguments:
+        workers {int} -- number of processes, 0 for one per cpu (default: {1})
+        schema {dict} -- columns read, see read_workbook (default: {None})
+    
+    Returns:
+        [list] -- file contents, in the order of files
+    """
+    files = list(files)
+    if not workers:
+        workers = os.cpu_count() or 1
+    workers = min(workers, len(files))
+
+    if workers <= 1:
+        results = [_timed_read(f, schema) for f in files]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_timed_read, files, [schema] * len(files)))
+
+    for f, (_, seconds) in zip(files, results):
+        metrics.ingest_file_seconds.observe(seconds, dataset=f.parent.name)
+        logger.debug("%s: parsed in %.3fs", f, seconds)
+
+    return [X for X, _ in results]
+
+
+def concat(files, save=True, name=None, workers=1):
     """Concat all files
     
     Arguments:
@@ -43,14 +370,20 @@ def concat(files, save=True, name=None):
     Keyword Arguments:
         save {bool} -- save concatenated file (default: {True})
         name {[type]} -- filename for output (default: {None})
+        workers {int} -- number of parsing processes (default: {1})
     
     Returns:
         [dataframe] -- concatenated file
     """
-    X = pd.concat([
-        pd.read_excel(f, converters={"LapTime": hhmmss_to_seconds})
-        for f in files
-    ])
+    frames, rejected = [], []
+    workbooks = read_workbooks(files, workers, SCHEMAS.get(name))
+    for f, frame in zip(files, workbooks):
+        frame, aside = clean(frame)
+        _log_rejected(aside, f)
+        frames.append(frame)
+        rejected.append(aside.assign(**{SOURCE: f.name}))
+
+    X = pd.concat(frames)
     X = X.reset_index()
 
     if save:
@@ -58,19 +391,320 @@ def concat(files, save=True, name=None):
         processed_folder.mkdir(parents=False, exist_ok=True)
 
         X.to_csv(processed_folder / "{}.csv".format(name), index=False)
+        if rejected:
+            pd.concat(rejected, sort=False).to_csv(
+                processed_folder / "{}.quarantine.csv".format(name),
+                index=False)
 
     return X
 
 
-def get_datasets(data_path, dataset_names, save=True):
+def fingerprint(f, previous=None):
+    """Identify the content of a file
+    
+    Arguments:
+        f {Pathlib path} -- xlsx file
+    
+    Keyword Arguments:
+        previous {dict} -- known fingerprint, reused as is when size and
+                           mtime did not change, and otherwise updated,
+                           keeping its other fields (default: {None})
+    
+    Returns:
+        [dict] -- size, mtime and sha256 of the file
+    """
+    stat = f.stat()
+    if previous and previous["size"] == stat.st_size and previous[
+            "mtime"] == stat.st_mtime:
+        return previous
+
+    # e.g. the months of a file touched or copied again without changes
+    return dict(previous or {},
+                size=stat.st_size,
+                mtime=stat.st_mtime,
+                sha256=hashlib.sha256(f.read_bytes()).hexdigest())
+
+
+def _read_manifest(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _replace(path, write):
+    """Write a file through a temporary file, so that concurrent readers
+    never see it half written"""
+    tmp = path.with_name("{}.{}.tmp".format(path.name, os.getpid()))
+    write(tmp)
+    os.replace(str(tmp), str(path))
+
+
+def _columnar(X):
+    """Make object columns storable in parquet
+    
+    Columns mixing several python types (e.g. dates typed as text in some
+    workbooks) are stored as strings.
+    """
+    for col in X.columns[X.dtypes == object]:
+        values = X[col].dropna()
+        if values.map(type).nunique() > 1:
+            X[col] = X[col].where(X[col].isna(), X[col].astype(str))
+
+    return X
+
+
+def season(month):
+    """Season of a month, e.g. 2019-2020 for 2020-01"""
+    year = int(month[:4])
+    if int(month[5:]) < SEASON_START:
+        year -= 1
+    return "{}-{}".format(year, year + 1)
+
+
+def _partition(folder, month):
+    return folder / season(month) / "{}.parquet".format(month)
+
+
+def _intact(partition, size=None):
+    """Whether a partition is still as written, when its size is known"""
+    try:
+        return size is None or partition.stat().st_size == size
+    except OSError:
+        return False
+
+
+@contextlib.contextmanager
+def _locked(path):
+    """Hold an exclusive lock on a file, waiting for other processes"""
+    if fcntl is None:
+        yield
+        return
+
+    with open(path, "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def load_cached(path,
+                name,
+                save=True,
+                workers=1,
+                rebuild=False,
+                months=None,
+                on_update=None):
+    """Get a dataset from the ingest cache, parsing only new or changed files
+    
+    The cache is partitioned by month. Only the partitions holding rows of
+    new, changed or removed files are rewritten, and only the last months
+    asked for are read.
+    
+    Arguments:
+        path {Pathlib path} -- main data directory
+        name {str} -- directory containing xlsx files
+    
+    Keyword Arguments:
+        save {bool} -- save the partitions changed as csv (default: {True})
+        workers {int} -- number of parsing processes (default: {1})
+        rebuild {bool} -- ignore the cache and parse every file (default: {False})
+        months {int} -- number of months read, back from the last one with
+                        data (default: {None}, every month)
+        on_update {function} -- called under the lock with the months of the
+                                partitions rewritten or removed, and every
+                                month left, e.g. to keep aggregates of the
+                                partitions up to date (default: {None})
+    
+    Rows rejected by clean are kept in {name}.quarantine.csv, with their
+    file and the failed check. Partitions missing or changed since written
+    are written again from their files. The cache is read and updated under
+    a lock, {name}.lock, so that processes sharing it parse each file once.
+    
+    Returns:
+        [DataFrame] -- concatenated files
+    """
+    folder = path / CACHE_FOLDER
+    folder.mkdir(parents=False, exist_ok=True)
+    with _locked(folder / "{}.lock".format(name)):
+        return _load_cached(folder, path, name, save, workers, rebuild, months,
+                            on_update)
+
+
+def _load_cached(folder, path, name, save, workers, rebuild, months, on_update):
+    """load_cached, once the lock is held"""
+    partitions = folder / name
+    manifest_file = folder / "{}.manifest.json".format(name)
+    quarantine_file = folder / "{}.quarantine.csv".format(name)
+
+    manifest = _read_manifest(manifest_file)
+    cached = manifest.get("files", {})
+    if rebuild or manifest.get("version") != INGEST_VERSION:
+        cached = {}
+    sizes = dict(manifest.get("partitions", {})) if cached else {}
+
+    # partitions deleted or changed since written, e.g. lost with a disk,
+    # are written again from the files with rows in them
+    lost = {
+        month for f in cached.values() for month in f["months"]
+        if not _intact(_partition(partitions, month), sizes.get(month))
+    }
+    if lost:
+        logger.warning("%s: %d partition(s) missing or changed", name,
+                       len(lost))
+
+    files = sorted(resolve(path, name))
+    fingerprints = {f.name: fingerprint(f, cached.get(f.name)) for f in files}
+
+    def outdated(f):
+        known = cached.get(f.name)
+        return (known is None or
+                known["sha256"] != fingerprints[f.name]["sha256"] or
+                bool(lost.intersection(known["months"])))
+
+    changed = [f for f in files if outdated(f)]
+    removed = set(cached) - set(fingerprints)
+    touched = set()
+
+    if changed or removed:
+        logger.info("%s: parsing %d new or changed file(s), %d removed", name,
+                    len(changed), len(removed))
+        stale = {f.name for f in changed} | removed
+        if not cached:
+            shutil.rmtree(str(partitions), ignore_errors=True)
+
+        # months holding rows of the stale files, before and after
+        touched |= {
+            month for source in stale if source in cached
+            for month in cached[source]["months"]
+        }
+        new = {}
+        rejected = []
+        if cached and quarantine_file.exists():
+            rejected.append(pd.read_csv(quarantine_file))
+            rejected[0] = rejected[0][~rejected[0][SOURCE].isin(stale)]
+        workbooks = read_workbooks(changed, workers, SCHEMAS.get(name))
+        for f, frame in zip(changed, workbooks):
+            frame, aside = clean(frame)
+            _log_rejected(aside, f)
+            frame = frame.reset_index().assign(**{SOURCE: f.name})
+            month = pd.to_datetime(frame.Date).dt.strftime("%Y-%m")
+            fingerprints[f.name] = dict(fingerprints[f.name],
+                                        months=sorted(month.unique()))
+            for key, rows in frame.groupby(month):
+                new.setdefault(key, []).append(rows)
+            rejected.append(aside.assign(**{SOURCE: f.name}))
+        touched |= set(new)
+
+        # keep the rows in file order
+        order = {key: i for i, key in enumerate(fingerprints)}
+        for month in sorted(touched):
+            target = _partition(partitions, month)
+            parts = new.get(month, [])
+            if cached and month not in lost and target.exists():
+                X = pd.read_parquet(target)
+                parts.insert(0, X[~X[SOURCE].isin(stale)])
+            X = pd.concat(parts, ignore_index=True, sort=False)
+            if X.empty:
+                if target.exists():
+                    target.unlink()
+                sizes.pop(month, None)
+                continue
+
+            X = X.iloc[X[SOURCE].map(order).argsort(kind="mergesort")]
+            X = _columnar(X.reset_index(drop=True))
+
+            target.parent.mkdir(parents=True, exist_ok=True)
+            _replace(target, lambda tmp: X.to_parquet(tmp, index=False))
+            sizes[month] = target.stat().st_size
+            if save:
+                X.drop(columns=SOURCE).to_csv(target.with_suffix(".csv"),
+                                              index=False)
+
+        logger.info("%s: %d partition(s) rewritten", name, len(touched))
+
+        rejected = pd.concat(rejected, ignore_index=True,
+                             sort=False) if rejected else pd.DataFrame(
+                                 columns=[SOURCE, REASON])
+        _replace(quarantine_file, lambda tmp: rejected.to_csv(tmp, index=False))
+
+    if (changed or removed or fingerprints != cached or
+            sizes != manifest.get("partitions")):
+        _replace(
+            manifest_file, lambda tmp: tmp.write_text(
+                json.dumps(dict(version=INGEST_VERSION,
+                                files=fingerprints,
+                                partitions=sizes),
+                           indent=2)))
+
+    available = sorted(
+        {month for f in fingerprints.values() for month in f["months"]})
+    if on_update is not None:
+        on_update(sorted(touched), available)
+    if months and available:
+        last = pd.Period(available[-1], freq="M")
+        first = str(last - (months - 1))
+        available = [month for month in available if month >= first]
+
+    frames = [
+        pd.read_parquet(_partition(partitions, month)) for month in available
+    ]
+    if not frames:
+        return pd.DataFrame(columns=list(SCHEMAS.get(name, [])))
+
+    return pd.concat(frames, ignore_index=True, sort=False).drop(columns=SOURCE)
+
+
+def read_partition(path, name, month, columns=None):
+    """Rows of one month of a dataset, from the ingest cache
+    
+    Arguments:
+        path {Pathlib path} -- main data directory
+        name {str} -- directory containing xlsx files
+        month {str} -- month, e.g. 2020-01
+    
+    Keyword Arguments:
+        columns {list} -- columns read (default: {None}, every column)
+    
+    Returns:
+        [DataFrame] -- rows of the month, see load_cached
+    """
+    X = pd.read_parquet(partition(path, name, month), columns=columns)
+    return X.drop(columns=SOURCE, errors="ignore")
+
+
+def partition(path, name, month):
+    """File of one month of a dataset in the ingest cache, see load_cached"""
+    return _partition(path / CACHE_FOLDER / name, month)
+
+
+def get_datasets(data_path,
+                 dataset_names,
+                 save=True,
+                 cache=True,
+                 workers=1,
+                 rebuild=False,
+                 months=None,
+                 on_update=None):
     """Get dataset
     
     Arguments:
-        data_path {str} -- data path
+        data_path {str} -- data path, of one team
         dataset_names {str} -- name of the resulting dataset
     
     Keyword Arguments:
         save {bool} -- save the dataset (default: {True})
+        cache {bool} -- only parse files that changed since the last
+                        call, see load_cached (default: {True})
+        workers {int} -- number of parsing processes, 0 for one per cpu
+                         (default: {1})
+        rebuild {bool} -- parse every file again (default: {False})
+        months {int} -- months of history read, with the cache (default:
+                        {None}, every month)
+        on_update {dict} -- on_update of load_cached, by dataset name
+                            (default: {None})
     
     Returns:
         [DataFrame] -- output dataset
@@ -79,29 +713,315 @@ def get_datasets(data_path, dataset_names, save=True):
 
     datasets = []
     for name in dataset_names:
-        files = resolve(p, name)
-        datasets.append(concat(files, save, name))
+        start = time.perf_counter()
+        if cache:
+            datasets.append(
+                load_cached(p,
+                            name,
+                            save,
+                            workers,
+                            rebuild,
+                            months,
+                            on_update=(on_update or {}).get(name)))
+        else:
+            files = sorted(resolve(p, name))
+            datasets.append(concat(files, save, name, workers))
+        metrics.ingest_seconds.observe(time.perf_counter() - start,
+                                       dataset=name)
 
     return datasets
 
 
+def scan(data_path, dataset_names):
+    """List the xlsx files of datasets, with their size and mtime
+    
+    Arguments:
+        data_path {str} -- data path
+        dataset_names {list} -- directories containing xlsx files
+    
+    Returns:
+        [frozenset] -- (team, directory, file name, size, mtime) of each file
+    """
+    files = set()
+    for team, folder in teams(data_path, dataset_names).items():
+        for name in dataset_names:
+            for f in resolve(folder, name):
+                try:
+                    stat = f.stat()
+                except OSError:
+                    continue
+                files.add((team, name, f.name, stat.st_size, stat.st_mtime))
+
+    return frozenset(files)
+
+
+class Watcher(threading.Thread):
+    """Poll the data directories and call reload when workbooks change
+    
+    A change is only acted upon once two consecutive scans agree, so files
+    still being copied are not ingested half written. Errors of reload are
+    logged and the previous data is kept.
+    
+    Arguments:
+        data_path {str} -- data path
+        dataset_names {list} -- directories containing xlsx files
+        reload {function} -- called without arguments on changes
+    
+    Keyword Arguments:
+        interval {float} -- seconds between scans (default: {30})
+        known {frozenset} -- scan of the loaded files (default: {None})
+    """
+
+    def __init__(self,
+                 data_path,
+                 dataset_names,
+                 reload,
+                 interval=30,
+                 known=None):
+        super().__init__(name="etl-watcher", daemon=True)
+        self.data_path = data_path
+        self.dataset_names = dataset_names
+        self.reload = reload
+        self.interval = interval
+        self.known = known
+        self._stopped = threading.Event()
+
+    def run(self):
+        if self.known is None:
+            self.known = scan(self.data_path, self.dataset_names)
+
+        pending = None
+        while not self._stopped.wait(self.interval):
+            files = scan(self.data_path, self.dataset_names)
+            if files == self.known:
+                pending = None
+                continue
+
+            if files != pending:
+                pending = files
+                continue
+
+            logger.info("data files changed, reloading")
+            try:
+                self.reload()
+            except Exception:
+                logger.exception("reload failed, keeping the previous data")
+            self.known = files
+            pending = None
+
+    def stop(self):
+        self._stopped.set()
+
+
+def memory_usage(X):
+    return X.memory_usage(index=True, deep=True).sum()
+
+
+def compact(X, categories=CATEGORIES, drop=DEAD_COLUMNS):
+    """Shrink a dataset in memory
+    
+    Text keys become categoricals, integers are downcast to the smallest
+    type holding their range, floats to float32 when no value changes, and
+    dead columns are dropped.
+    
+    Arguments:
+        X {DataFrame} -- dataset
+    
+    Keyword Arguments:
+        categories {list} -- columns stored as categoricals (default: {CATEGORIES})
+        drop {list} -- columns dropped (default: {DEAD_COLUMNS})
+    
+    Returns:
+        [DataFrame] -- compacted dataset
+    """
+    before = memory_usage(X)
+    X = X.drop(columns=[col for col in drop if col in X])
+
+    for col in X.columns:
+        values = X[col]
+        if col in categories:
+            X[col] = values.astype("category")
+        elif pd.api.types.is_integer_dtype(values):
+            X[col] = pd.to_numeric(values, downcast="integer")
+        elif pd.api.types.is_float_dtype(values):
+            narrow = values.astype(np.float32)
+            if ((narrow == values) | values.isna()).all():
+                X[col] = narrow
+
+    logger.info("compacted %d rows from %.1fkB to %.1fkB", len(X),
+                before / 1024,
+                memory_usage(X) / 1024)
+
+    return X
+
+
+class Dataset:
+    """Dataset sorted by date, with the lookups used by filter_dataset
+    
+    A timeframe is then a contiguous slice found by binary search, and a
+    population the part of its prebuilt row positions within that slice.
+    
+    Arguments:
+        frame {DataFrame} -- dataset, with Date and Position columns
+    
+    Keyword Arguments:
+        name {str} -- dataset name (default: {None})
+        version {int} -- dataset version, changed whenever the data changes
+                         (default: {0})
+    """
+
+    def __init__(self, frame, name=None, version=0):
+        self.name = name
+        self.version = version
+
+        frame = frame.sort_values("Date", kind="mergesort")
+        self.frame = frame.reset_index(drop=True)
+
+        # missing dates are sorted last and never selected
+        valid = self.frame.Date.notna().sum()
+        self.dates = self.frame.Date.values[:valid]
+        self.max_date = self.frame.Date.max()
+        self.positions = self.frame.groupby("Position").indices
+
+    def __len__(self):
+        return len(self.frame)
+
+    def rows(self, timeframe, population=None):
+        """Row positions of a timeframe and population
+        
+        Arguments:
+            timeframe {int} -- days past last training
+        
+        Keyword Arguments:
+            population {str} -- subset of population (default: {None})
+        
+        Returns:
+            [slice or array] -- slice for a whole timeframe, sorted row
+                                positions for a population
+        """
+        if not len(self.dates):
+            return slice(0, 0)
+
+        lower = self.max_date - dt.timedelta(days=timeframe)
+        start = self.dates.searchsorted(lower.to_datetime64(), side="left")
+        stop = len(self.dates)
+
+        if not population:
+            return slice(start, stop)
+
+        rows = self.positions.get(population, np.empty(0, dtype=np.intp))
+        return rows[rows.searchsorted(start):rows.searchsorted(stop)]
+
+    def select(self, timeframe, population=None):
+        """Subset on timeframe and population
+        
+        Arguments:
+            timeframe {int} -- days past last training
+        
+        Keyword Arguments:
+            population {str} -- subset of population (default: {None})
+        
+        Returns:
+            [DataFrame] -- Subset of the dataset
+        """
+        return self.frame.iloc[self.rows(timeframe, population)]
+
+
 def filter_dataset(dataset, timeframe, population):
     """filter dataset on timeframe and population
     
     Arguments:
-        dataset {DataFrame} -- dataset to subset from
+        dataset {Dataset} -- dataset to subset from, DataFrames are indexed
+                             on the fly
         timeframe {int} -- days past last training
         population {str} -- subset of population
     
     Returns:
         [DataFrame] -- Subset of the original dataset
     """
-    upper = dataset.Date.max()
-    lower = upper - dt.timedelta(days=timeframe)
+    if not isinstance(dataset, Dataset):
+        dataset = Dataset(dataset)
+
+    return dataset.select(timeframe, population)
+
+
+CacheInfo = namedtuple("CacheInfo", ["hits", "misses", "maxsize", "currsize"])
+
+
+class FilterCache:
+    """LRU cache of filter_dataset results, shared by the callbacks
+    
+    Results are keyed by dataset name and version, timeframe and population,
+    so a new dataset version never returns stale subsets.
+    
+    Keyword Arguments:
+        maxsize {int} -- number of subsets kept (default: {64})
+    """
+
+    def __init__(self, maxsize=64):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._results = OrderedDict()
+        self._lock = threading.Lock()
+
+    def filter(self, dataset, timeframe, population):
+        """Cached filter_dataset, see filter_dataset"""
+        key = (dataset.name, dataset.version, timeframe, population)
+
+        with self._lock:
+            if key in self._results:
+                self.hits += 1
+                self._results.move_to_end(key)
+                return self._results[key]
+            self.misses += 1
+
+        result = filter_dataset(dataset, timeframe, population)
+
+        with self._lock:
+            self._results[key] = result
+            while len(self._results) > self.maxsize:
+                self._results.popitem(last=False)
+
+        return result
+
+    def info(self):
+        """Cache statistics, as in functools.lru_cache
+        
+        Returns:
+            [CacheInfo] -- hits, misses, maxsize and currsize
+        """
+        with self._lock:
+            return CacheInfo(self.hits, self.misses, self.maxsize,
+                             len(self._results))
+
+    def clear(self):
+        with self._lock:
+            self._results.clear()
+            self.hits = self.misses = 0
+
 
-    mask = (dataset.Date <= upper) & (dataset.Date >= lower)
+if __name__ == "__main__":
+    import argparse
 
-    if population:
-        mask = mask & (dataset.Position == population)
+    parser = argparse.ArgumentParser(description="Ingest xlsx files")
+    parser.add_argument("names", nargs="*", default=["RPE", "Seances"])
+    parser.add_argument("--data", default="./data")
+    parser.add_argument("--workers",
+                        type=int,
+                        default=0,
+                        help="parsing processes, 0 for one per cpu")
+    parser.add_argument("--rebuild",
+                        action="store_true",
+                        help="parse every file again")
+    args = parser.parse_args()
 
-    return dataset[mask]
+    logging.basicConfig(level=logging.INFO)
+    for team, folder in teams(args.data, args.names).items():
+        for name, X in zip(
+                args.names,
+                get_datasets(folder,
+                             args.names,
+                             workers=args.workers,
+                             rebuild=args.rebuild)):
+            logger.info("%s %s: %d rows", team, name, len(X))
@@ -0,0 +1,196 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import utils.etl as etl
+
+logger = logging.getLogger(__name__)
+
+# Records of the feed have the columns of the Seances workbooks, with every
+# duration in seconds, e.g. the heart rate zones
+SCHEMA = OrderedDict((col, "seconds" if kind in etl.DURATIONS else kind)
+                     for col, kind in etl.SCHEMAS["Seances"].items())
+
+# Heart rates kept per player by the graphs, an hour at one record a second
+MAX_POINTS = 3600
+
+
+class Session:
+    """Aggregates of the session being recorded, updated with each record
+    
+    The heart rates are appended to a log, the same in every worker reading
+    the feed, so a position in the log is a cursor for the points sent
+    after it. Summed columns, e.g. the time in each heart rate zone, are
+    kept as running totals per player.
+    
+    Arguments:
+        columns {list} -- columns summed per player
+    """
+
+    def __init__(self, columns):
+        self.columns = list(columns)
+        # hash of the first record, the same in every worker
+        self.key = None
+        # valid records, also the same in every worker
+        self.records = 0
+        self.players = []
+        self._times = []
+        self._players = []
+        self._rates = []
+        self._totals = pd.DataFrame(columns=self.columns, dtype=float)
+        self._lock = threading.Lock()
+
+    def update(self, records):
+        """Add records to the session
+        
+        Arguments:
+            records {list} -- records, as decoded from the feed
+        
+        Returns:
+            [int] -- number of valid records
+        """
+        if not records:
+            return 0
+
+        X = etl.enforce(pd.DataFrame.from_records(records), SCHEMA)
+        X, rejected = etl.clean(X)
+        if len(rejected):
+            logger.warning("live feed: %d record(s) kept aside (%s)",
+                           len(rejected),
+                           ", ".join(rejected[etl.REASON].unique()))
+        rates = X[X.Fcmoy > 0]
+        totals = X.groupby("Nom")[self.columns].sum()
+
+        with self._lock:
+            if self.key is None:
+                self.key = hashlib.sha1(
+                    json.dumps(records[0], sort_keys=True,
+                               default=str).encode()).hexdigest()
+            self.players += [
+                player for player in X.Nom.unique()
+                if player not in self.players
+            ]
+            self._times += list(rates.Date.values)
+            self._players += list(rates.Nom)
+            self._rates += list(rates.Fcmoy.astype(float))
+            self._totals = self._totals.add(totals, fill_value=0)
+            self.records += len(X)
+
+        return len(X)
+
+    def rates(self, start=0):
+        """Heart rates recorded after a cursor, by player
+        
+        Keyword Arguments:
+            start {int} -- cursor, position in the log (default: {0})
+        
+        Returns:
+            [tuple] -- players of the session, times and rates of each
+                       player with new points, and the cursor after them
+        """
+        with self._lock:
+            known = list(self.players)
+            end = len(self._rates)
+            times = np.array(self._times[start:], dtype="datetime64[ms]")
+            players = np.array(self._players[start:], dtype=object)
+            rates = np.array(self._rates[start:])
+
+        points = OrderedDict()
+        for player in pd.unique(players):
+            mine = players == player
+            points[player] = (times[mine][-MAX_POINTS:],
+                              rates[mine][-MAX_POINTS:])
+        return known, points, end
+
+    def totals(self):
+        """Running totals of the summed columns, one row per player"""
+        with self._lock:
+            return self._totals.reindex(self.players, fill_value=0)
+
+
+class Feed(threading.Thread):
+    """Tail a newline-delimited JSON file written by the receivers
+    
+    Complete lines appended since the last poll are read from the offset
+    reached, and added to the session. A file replaced or truncated starts
+    a new session. Errors are logged and the file is polled again.
+    
+    Arguments:
+        path {str} -- feed file, one JSON record per line
+        columns {list} -- columns summed per player, see Session
+    
+    Keyword Arguments:
+        interval {float} -- seconds between polls (default: {1})
+    """
+
+    def __init__(self, path, columns, interval=1):
+        super().__init__(name="live-feed", daemon=True)
+        self.path = Path(path)
+        self.columns = columns
+        self.interval = interval
+        self.session = Session(columns)
+        self._file = None
+        self._offset = 0
+        self._partial = b""
+        self._stopped = threading.Event()
+
+    def poll(self):
+        """Read the lines appended since the last poll
+        
+        Returns:
+            [int] -- number of valid records read
+        """
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return 0
+
+        file = (stat.st_dev, stat.st_ino)
+        if file != self._file or stat.st_size < self._offset:
+            if self._file is not None:
+                logger.info("live feed: %s replaced, new session", self.path)
+            self.session = Session(self.columns)
+            self._file, self._offset, self._partial = file, 0, b""
+        if stat.st_size == self._offset:
+            return 0
+
+        with open(self.path, "rb") as f:
+            f.seek(self._offset)
+            data = f.read()
+        self._offset += len(data)
+
+        # an incomplete last line waits for the rest of it
+        lines = (self._partial + data).split(b"\n")
+        self._partial = lines.pop()
+
+        records, malformed = [], 0
+        for line in lines:
+            if not line.strip():
+                continue
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                malformed += 1
+        if malformed:
+            logger.warning("live feed: %d malformed line(s)", malformed)
+
+        return self.session.update(records)
+
+    def run(self):
+        while True:
+            try:
+                self.poll()
+            except Exception:
+                logger.exception("reading the live feed failed")
+            if self._stopped.wait(self.interval):
+                break
+
+    def stop(self):
+        self._stopped.set()
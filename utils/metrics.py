@@ -0,0 +1,233 @@
+import functools
+import threading
+import time
+from collections import OrderedDict
+
+import flask
+
+# Histogram buckets, in seconds
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1,
+           2.5, 5, 10, 30)
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    return "{{{}}}".format(",".join(
+        '{}="{}"'.format(key,
+                         str(value).replace("\\", "\\\\").replace('"', '\\"'))
+        for key, value in labels))
+
+
+class Histogram:
+    """Prometheus histogram
+    
+    Arguments:
+        name {str} -- metric name
+        documentation {str} -- metric help
+    
+    Keyword Arguments:
+        buckets {tuple} -- upper bounds, in seconds (default: {BUCKETS})
+    """
+
+    def __init__(self, name, documentation, buckets=BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = buckets
+        self._series = OrderedDict()
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            if key not in self._series:
+                self._series[key] = dict(buckets=[0] * len(self.buckets),
+                                         sum=0.,
+                                         count=0)
+            series = self._series[key]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series["buckets"][i] += 1
+            series["sum"] += value
+            series["count"] += 1
+
+    def render(self):
+        lines = [
+            "# HELP {} {}".format(self.name, self.documentation),
+            "# TYPE {} histogram".format(self.name)
+        ]
+        with self._lock:
+            for key, series in self._series.items():
+                for bound, count in zip(self.buckets + ("+Inf",),
+                                        series["buckets"] + [series["count"]]):
+                    lines.append("{}_bucket{} {}".format(
+                        self.name, _labels(key + (("le", bound),)), count))
+                lines.append("{}_sum{} {}".format(self.name, _labels(key),
+                                                  series["sum"]))
+                lines.append("{}_count{} {}".format(self.name, _labels(key),
+                                                    series["count"]))
+
+        return lines
+
+
+class Gauge:
+    """Prometheus gauge read from a function when rendered
+    
+    Arguments:
+        name {str} -- metric name
+        documentation {str} -- metric help
+        read {function} -- returns the value, or a dict of label tuples to
+                           values
+    """
+
+    def __init__(self, name, documentation, read):
+        self.name = name
+        self.documentation = documentation
+        self.read = read
+
+    def render(self):
+        lines = [
+            "# HELP {} {}".format(self.name, self.documentation),
+            "# TYPE {} gauge".format(self.name)
+        ]
+        values = self.read()
+        if not isinstance(values, dict):
+            values = {(): values}
+        for key, value in values.items():
+            lines.append("{}{} {}".format(self.name, _labels(key),
+                                          float(value)))
+
+        return lines
+
+
+METRICS = OrderedDict()
+
+
+def histogram(name, documentation):
+    """Get or create a histogram"""
+    if name not in METRICS:
+        METRICS[name] = Histogram(name, documentation)
+    return METRICS[name]
+
+
+def gauge(name, documentation, read):
+    """Register a gauge"""
+    METRICS[name] = Gauge(name, documentation, read)
+    return METRICS[name]
+
+
+def render():
+    """Every metric, in the Prometheus text format
+    
+    Returns:
+        [str] -- exposition text
+    """
+    lines = []
+    for metric in METRICS.values():
+        lines += metric.render()
+    return "\n".join(lines) + "\n"
+
+
+callback_seconds = histogram("asruc_callback_seconds",
+                             "Time spent in callbacks, by phase")
+request_seconds = histogram("asruc_request_seconds",
+                            "Callback requests, by output and phase")
+ingest_seconds = histogram("asruc_ingest_seconds", "Dataset ingest time")
+ingest_file_seconds = histogram("asruc_ingest_file_seconds",
+                                "Workbook parsing time")
+
+_local = threading.local()
+
+
+def _request_phases():
+    """Phase durations of the current request, None outside requests"""
+    if not flask.has_request_context():
+        return None
+    if "phases" not in flask.g:
+        flask.g.phases = OrderedDict()
+    return flask.g.phases
+
+
+def timed(func):
+    """Time a callback, split in phases with lap
+    
+    The time since the last lap is counted as the "figure" phase.
+    """
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        previous = getattr(_local, "stopwatch", None)
+        _local.stopwatch = [func.__name__, time.perf_counter()]
+        try:
+            return func(*args, **kwargs)
+        finally:
+            lap("figure")
+            _local.stopwatch = previous
+
+    return wrapper
+
+
+def lap(phase):
+    """Count the time since the previous lap of the callback in phase
+    
+    Arguments:
+        phase {str} -- e.g. "filter", "aggregate", "figure"
+    """
+    stopwatch = getattr(_local, "stopwatch", None)
+    if stopwatch is None:
+        return
+
+    now = time.perf_counter()
+    duration = now - stopwatch[1]
+    stopwatch[1] = now
+
+    callback_seconds.observe(duration, callback=stopwatch[0], phase=phase)
+
+    phases = _request_phases()
+    if phases is not None:
+        phases[phase] = phases.get(phase, 0.) + duration
+
+
+def init_app(server, path="/metrics"):
+    """Serve the metrics and time the callback requests
+    
+    Callback responses get a Server-Timing header with the time of each
+    phase, and "serialize" for the rest of the request: Dash decoding the
+    inputs and encoding the output.
+    
+    Arguments:
+        server {Flask} -- Dash server
+    
+    Keyword Arguments:
+        path {str} -- route of the metrics (default: {"/metrics"})
+    """
+
+    @server.route(path)
+    def metrics():
+        return flask.Response(render(), mimetype="text/plain; version=0.0.4")
+
+    @server.before_request
+    def start_timer():
+        flask.g.request_start = time.perf_counter()
+
+    @server.after_request
+    def server_timing(response):
+        if (not flask.request.path.endswith("_dash-update-component") or
+                response.status_code != 200):
+            return response
+
+        total = time.perf_counter() - flask.g.request_start
+        phases = flask.g.get("phases", OrderedDict())
+        phases["serialize"] = max(total - sum(phases.values()), 0.)
+
+        body = flask.request.get_json(silent=True) or {}
+        output = body.get("output", "")
+        for phase, duration in phases.items():
+            request_seconds.observe(duration, output=output, phase=phase)
+        request_seconds.observe(total, output=output, phase="total")
+
+        response.headers["Server-Timing"] = ", ".join(
+            "{};dur={:.3f}".format(phase, duration * 1e3)
+            for phase, duration in list(phases.items()) + [("total", total)])
+
+        return response
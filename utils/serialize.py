@@ -0,0 +1,152 @@
+import datetime as dt
+import json
+import uuid
+
+import numpy as np
+import pandas as pd
+
+import flask
+import plotly.utils
+
+try:
+    import orjson
+except ImportError:  # plain json, still without per element conversions
+    orjson = None
+
+# numpy arrays encoded by orjson itself, without a list in between, for the
+# dtypes the version pinned in requirements.txt supports, e.g. the int8 and
+# bool columns of etl.compact. Others, e.g. float16, are converted to lists
+# first
+NUMPY = getattr(orjson, "OPT_SERIALIZE_NUMPY", 0)
+NUMPY_DTYPES = {
+    np.dtype(kind) for kind in [
+        "float64", "float32", "int64", "int32", "int16", "int8", "uint64",
+        "uint32", "uint16", "uint8", "bool"
+    ]
+}
+
+# Outputs encoded ahead of requests are replaced by this placeholder, then
+# spliced in the response, see encoded
+PLACEHOLDER = "__encoded_{}_{{}}__".format(uuid.uuid4().hex)
+
+
+def _dates(values):
+    """ISO strings of datetime64 values, as datetime.isoformat writes them"""
+    text = np.datetime_as_string(values, unit="s").astype(object)
+    fraction = values.astype("datetime64[s]") != values
+    if fraction.any():
+        text[fraction] = np.datetime_as_string(values[fraction], unit="us")
+    text[np.isnat(values)] = None
+    return text.tolist()
+
+
+def _array(values):
+    """Values of an array, Series or Index, JSON-native or numpy"""
+    values = np.asarray(values)
+    kind = values.dtype.kind
+    if kind == "M":
+        return _dates(values)
+    if kind == "f":
+        if not np.isfinite(values).all():
+            # null for NaN, as plotly's encoder does
+            values = np.where(np.isfinite(values), values, None)
+            return values.tolist()
+    if kind in "biuf":
+        if NUMPY and values.dtype in NUMPY_DTYPES:
+            return np.ascontiguousarray(values)
+        return values.tolist()
+    if kind == "O":
+        # e.g. categories, with NaN for missing values
+        values = np.where(pd.isna(values), None, values)
+    return values.tolist()
+
+
+def _default(obj):
+    if isinstance(obj, (np.ndarray, pd.Series, pd.Index)):
+        return _array(obj)
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if isinstance(obj, (dt.date, dt.time)):
+        return obj.isoformat()
+    return plotly.utils.PlotlyJSONEncoder().default(obj)
+
+
+def _null(constant):
+    return None
+
+
+def dumps(obj):
+    """Encode a callback output, with numpy and pandas values
+    
+    Arrays, Series and Indexes are converted at once rather than value by
+    value, and encoded by orjson when it is installed. NaN and infinities
+    are written as null.
+    
+    Arguments:
+        obj -- callback output
+    
+    Returns:
+        [bytes] -- JSON
+    """
+    if orjson is not None:
+        return orjson.dumps(obj, default=_default, option=NUMPY)
+    return json.dumps(to_native(obj)).encode()
+
+
+def to_native(obj):
+    """Callback output as JSON-native values
+    
+    Arguments:
+        obj -- callback output
+    
+    Returns:
+        JSON-native copy
+    """
+    if orjson is not None:
+        return orjson.loads(dumps(obj))
+    return json.loads(json.dumps(obj, default=_default), parse_constant=_null)
+
+
+def encoded(data):
+    """Output of a callback already encoded, e.g. once per data version
+    
+    Dash encodes the outputs with plotly's encoder, value by value. The
+    output is passed to Dash as a placeholder instead, and its JSON spliced
+    in the response once built, see init_app.
+    
+    Arguments:
+        data {bytes} -- JSON
+    
+    Returns:
+        placeholder, or the decoded output outside of a request
+    """
+    if not flask.has_request_context():
+        return json.loads(data)
+
+    if "encoded" not in flask.g:
+        flask.g.encoded = {}
+    key = PLACEHOLDER.format(len(flask.g.encoded))
+    flask.g.encoded[key] = data
+    return key
+
+
+def init_app(server):
+    """Splice the outputs passed through encoded in the callback responses
+    
+    Registered after Flask-Compress, so that it runs before the response is
+    compressed.
+    
+    Arguments:
+        server {Flask} -- Dash server
+    """
+
+    @server.after_request
+    def splice(response):
+        if not flask.g.get("encoded"):
+            return response
+
+        body = response.get_data()
+        for key, data in flask.g.encoded.items():
+            body = body.replace(json.dumps(key).encode(), data, 1)
+        response.set_data(body)
+        return response
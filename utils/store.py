@@ -0,0 +1,286 @@
+import functools
+import itertools
+import json
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import utils.serialize as serialize
+
+logger = logging.getLogger(__name__)
+
+
+class FigureStore:
+    """Callback outputs for every control combination, computed ahead of
+    requests
+    
+    The controls are finite, so each callback registered with precomputed
+    is run once per combination of its inputs after each data load. The
+    callback then answers with the stored payload, and only falls back to
+    computing it for values outside its domains.
+    
+    The payloads can be split in parts by the value of one argument, e.g.
+    the team. Each part is then built, versioned and packed in a bundle on
+    its own, which the browser keeps to answer the callbacks of that part
+    without requests.
+    
+    When the data changes, refresh rebuilds the payloads of a part in a
+    background pool while the previous ones are still served, and swaps
+    them once all are done. Payloads that fail to build are replaced by the
+    failed output of their callback, e.g. an error figure, as the browser
+    cannot compute them.
+    
+    Keyword Arguments:
+        workers {int} -- threads of the background pool (default: {1})
+        part {int} -- position of the argument splitting the payloads in
+                      parts (default: {None}, one part, None)
+    """
+
+    def __init__(self, workers=1, part=None):
+        self.part = part
+        self._builders = {}
+        self._lookups = {}
+        # version, payloads and encoded bundle of each part
+        self._versions = {}
+        self._payloads = {}
+        self._encoded = {}
+        self._pool = ThreadPoolExecutor(max_workers=workers,
+                                        thread_name_prefix="figure-store")
+        self._generations = {}
+        self._failed = {}
+        self._status = dict(building={}, queued=0, running=0, seconds=None)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return sum(map(len, list(self._payloads.values())))
+
+    def _part(self, args):
+        return None if self.part is None else args[self.part]
+
+    def precomputed(self, *domains, failed=None):
+        """Register a callback
+        
+        Arguments:
+            domains {iterable} -- possible values of each argument
+        
+        Keyword Arguments:
+            failed -- output stored when the callback fails (default: {None})
+        
+        Returns:
+            [function] -- decorator
+        """
+
+        def wrap(func):
+            name = func.__name__
+
+            @functools.wraps(func)
+            def lookup(*args):
+                payloads = self._payloads.get(self._part(args), {})
+                payload = payloads.get((name, args))
+                if payload is None:
+                    return func(*args)
+                return payload
+
+            self._builders[name] = (func, domains, serialize.to_native(failed))
+            self._lookups[name] = lookup
+            return lookup
+
+        return wrap
+
+    def builder(self, name):
+        """Registered callback, computing its output
+        
+        Arguments:
+            name {str} -- callback name
+        
+        Returns:
+            [function] -- undecorated callback
+        """
+        return self._builders[name][0]
+
+    def served(self, name):
+        """Registered callback, answering from the store
+        
+        Arguments:
+            name {str} -- callback name
+        
+        Returns:
+            [function] -- decorated callback
+        """
+        return self._lookups[name]
+
+    def _jobs(self, part):
+        jobs = []
+        for name, (func, domains, failed) in self._builders.items():
+            if self.part is not None:
+                domains = list(domains)
+                domains[self.part] = [part]
+            jobs += [(name, args) for args in itertools.product(*domains)]
+        return jobs
+
+    def _build(self, name, args, generation):
+        func, domains, failed = self._builders[name]
+        try:
+            # stored as JSON-native values, which Dash encodes without any
+            # pandas or numpy conversion
+            return serialize.to_native(func(*args))
+        except Exception:
+            logger.exception("precomputing %s%s failed", name, args)
+            part = self._part(args)
+            with self._lock:
+                # failures of a dropped rebuild are not the current one's
+                if generation == self._generations[part]:
+                    self._failed[part] += 1
+            return failed
+
+    def _start(self, version, part):
+        """Start a rebuild of a part, dropping the one in progress"""
+        with self._lock:
+            generation = self._generations.get(part, 0) + 1
+            self._generations[part] = generation
+            self._failed[part] = 0
+            self._status["building"][part] = version
+        return generation
+
+    def _swap(self, payloads, version, part, start, generation):
+        """Serve the payloads of a rebuild, unless a newer one started"""
+        encoded = serialize.dumps(self._pack(payloads, version))
+        seconds = time.perf_counter() - start
+        with self._lock:
+            if generation != self._generations[part]:
+                return
+            self._payloads[part] = payloads
+            self._encoded[part] = encoded
+            self._versions[part] = version
+            del self._status["building"][part]
+            self._status["seconds"] = seconds
+
+        logger.info("precomputed %d payloads in %.2fs", len(payloads), seconds)
+
+    def rebuild(self, version, part=None):
+        """Run every registered callback over its domains
+        
+        The new payloads replace the previous ones at once, so requests
+        never see a partially rebuilt store. They are dropped if another
+        rebuild of the part started meanwhile.
+        
+        Arguments:
+            version -- version of the data the payloads are built from
+        
+        Keyword Arguments:
+            part -- value of the argument splitting the payloads, only
+                    these payloads are built (default: {None})
+        """
+        start = time.perf_counter()
+        # background rebuilds in progress are dropped
+        generation = self._start(version, part)
+        payloads = {
+            job: self._build(*job, generation) for job in self._jobs(part)
+        }
+        self._swap(payloads, version, part, start, generation)
+
+    def refresh(self, version, part=None):
+        """Rebuild in the background, serving the current payloads meanwhile
+        
+        A refresh of the part started before and not done yet is dropped,
+        along with its failures. Payloads that fail to build are replaced by
+        their failed output, and counted in the status until the next
+        rebuild.
+        
+        Arguments:
+            version -- version of the data the payloads are built from
+        
+        Keyword Arguments:
+            part -- value of the argument splitting the payloads, see
+                    rebuild (default: {None})
+        """
+        start = time.perf_counter()
+        jobs = self._jobs(part)
+        payloads = {}
+        remaining = [len(jobs)]
+
+        generation = self._start(version, part)
+        with self._lock:
+            self._status["queued"] += len(jobs)
+
+        def run(job):
+            with self._lock:
+                self._status["queued"] -= 1
+                if generation != self._generations[part]:
+                    return
+                self._status["running"] += 1
+
+            payloads[job] = self._build(*job, generation)
+
+            with self._lock:
+                self._status["running"] -= 1
+                remaining[0] -= 1
+                done = not remaining[0]
+
+            if done:
+                self._swap(payloads, version, part, start, generation)
+
+        if not jobs:
+            self._swap(payloads, version, part, start, generation)
+        for job in jobs:
+            self._pool.submit(run, job)
+
+    def version(self, part=None):
+        """Version of the data the payloads of a part are built from
+        
+        Keyword Arguments:
+            part -- value of the argument splitting the payloads
+                    (default: {None})
+        
+        Returns:
+            version, None before the part is first built
+        """
+        return self._versions.get(part)
+
+    def status(self):
+        """Versions served and background rebuild progress
+        
+        Returns:
+            [dict] -- version of each part, size, building (version being
+                      rebuilt, by part), queued and running jobs, jobs
+                      failed in the last rebuild of each part, and seconds
+                      the last rebuild took
+        """
+        with self._lock:
+            return dict(self._status,
+                        building=dict(self._status["building"]),
+                        versions=dict(self._versions),
+                        failed=sum(self._failed.values()),
+                        size=len(self))
+
+    @staticmethod
+    def _pack(payloads, version):
+        """Payloads of every callback, keyed by their arguments joined with
+        "|", with the figure layouts shared by several payloads stored once"""
+        layouts, indices, outputs = [], {}, {}
+        for (name, args), payload in payloads.items():
+            if isinstance(payload, dict) and "layout" in payload:
+                key = json.dumps(payload["layout"], sort_keys=True)
+                if key not in indices:
+                    indices[key] = len(layouts)
+                    layouts.append(payload["layout"])
+                payload = dict(payload, layout=indices[key])
+            outputs.setdefault(name, {})["|".join(map(str, args))] = payload
+
+        return dict(version=version, layouts=layouts, outputs=outputs)
+
+    def encoded_bundle(self, part=None):
+        """Every payload of a part, for the browser to answer the callbacks
+        itself, encoded once when the payloads are swapped in
+        
+        Keyword Arguments:
+            part -- value of the argument splitting the payloads
+                    (default: {None})
+        
+        Returns:
+            [bytes] -- JSON of the version, layouts and outputs of the
+                       callbacks, see assets/resizing_script.js. None before
+                       the part is first built
+        """
+        return self._encoded.get(part)
@@ -0,0 +1,168 @@
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+import utils.metrics as metrics
+
+# DataTable filter operators, as written in filter_query
+OPERATORS = [["ge ", ">="], ["le ", "<="], ["lt ", "<"], ["gt ", ">"],
+             ["ne ", "!="], ["eq ", "="], ["contains "], ["datestartswith "]]
+
+
+def split_filter_part(filter_part):
+    """Parse one condition of a DataTable filter query
+    
+    Arguments:
+        filter_part {str} -- condition, e.g. "{Fcmax} > 180"
+    
+    Returns:
+        [tuple] -- column, operator name and value, Nones if not understood
+    """
+    for operator_type in OPERATORS:
+        for operator in operator_type:
+            if operator in filter_part:
+                name_part, value_part = filter_part.split(operator, 1)
+                name = name_part[name_part.find("{") + 1:name_part.rfind("}")]
+
+                value_part = value_part.strip()
+                v0 = value_part[:1]
+                if v0 and v0 == value_part[-1] and v0 in ("'", '"', "`"):
+                    value = value_part[1:-1].replace("\\" + v0, v0)
+                else:
+                    try:
+                        value = float(value_part)
+                    except ValueError:
+                        value = value_part
+
+                return name, operator_type[0].strip(), value
+
+    return None, None, None
+
+
+def _match(values, operator, value):
+    if operator == "contains":
+        return values.astype(str).str.contains(str(value), regex=False)
+    if operator == "datestartswith":
+        return values.astype(str).str.startswith(str(value))
+
+    try:
+        return getattr(values, operator)(value)
+    except (TypeError, ValueError):
+        # e.g. text compared to a number, compare them as text
+        return getattr(values.astype(str), operator)(str(value))
+
+
+class TableView:
+    """Projection of a dataset served page by page to a DataTable
+    
+    The columns are projected once, and the sort order of each column is
+    computed once for the dataset version. The rows of a (timeframe,
+    population, filter, sort) combination are kept in a small LRU cache, so
+    turning pages only costs the page itself.
+    
+    Arguments:
+        dataset {Dataset} -- dataset shown
+        columns {list} -- columns shown
+    
+    Keyword Arguments:
+        maxsize {int} -- number of row selections kept (default: {32})
+    """
+
+    def __init__(self, dataset, columns, maxsize=32):
+        self.dataset = dataset
+        self.frame = dataset.frame[columns]
+
+        self._orders = {col: self._order(self.frame[col]) for col in columns}
+        self._rows = OrderedDict()
+        self._maxsize = maxsize
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _order(values):
+        """Stable ascending order of a column, missing values last"""
+        try:
+            order = values.sort_values(kind="mergesort", na_position="last")
+        except TypeError:
+            # mixed types, sorted as text
+            text = values.where(values.isna(), values.astype(str))
+            order = text.sort_values(kind="mergesort", na_position="last")
+
+        return order.index.values, values.notna().sum()
+
+    def rows(self, timeframe, population, sort_by, filter_query):
+        """Row positions, filtered and sorted
+        
+        Arguments:
+            timeframe {int} -- days past last training
+            population {str} -- subset of population
+            sort_by {list} -- DataTable sort_by
+            filter_query {str} -- DataTable filter_query
+        
+        Returns:
+            [array] -- row positions in display order
+        """
+        sort = tuple((s["column_id"], s["direction"]) for s in sort_by or [])
+        key = (timeframe, population, sort, filter_query or "")
+
+        with self._lock:
+            if key in self._rows:
+                self._rows.move_to_end(key)
+                return self._rows[key]
+
+        rows = np.arange(len(self.frame))[self.dataset.rows(
+            timeframe, population)]
+
+        for filter_part in (filter_query or "").split(" && "):
+            name, operator, value = split_filter_part(filter_part)
+            if name in self.frame:
+                values = self.frame[name].iloc[rows]
+                rows = rows[_match(values, operator, value).values]
+
+        for column_id, direction in sort[:1]:
+            if column_id not in self._orders:
+                continue
+            order, valid = self._orders[column_id]
+
+            selected = np.zeros(len(self.frame), dtype=bool)
+            selected[rows] = True
+            present = order[:valid][selected[order[:valid]]]
+            missing = order[valid:][selected[order[valid:]]]
+
+            if direction == "desc":
+                present = present[::-1]
+            rows = np.concatenate([present, missing])
+
+        with self._lock:
+            self._rows[key] = rows
+            while len(self._rows) > self._maxsize:
+                self._rows.popitem(last=False)
+
+        return rows
+
+    def clear(self):
+        with self._lock:
+            self._rows.clear()
+
+    def page(self, timeframe, population, sort_by, filter_query, page_current,
+             page_size):
+        """One page of the table
+        
+        Arguments:
+            timeframe {int} -- days past last training
+            population {str} -- subset of population
+            sort_by {list} -- DataTable sort_by
+            filter_query {str} -- DataTable filter_query
+            page_current {int} -- page number
+            page_size {int} -- rows per page
+        
+        Returns:
+            [tuple] -- records of the page, and number of pages
+        """
+        rows = self.rows(timeframe, population, sort_by, filter_query)
+        metrics.lap("filter")
+
+        page = rows[page_current * page_size:(page_current + 1) * page_size]
+
+        return (self.frame.iloc[page].to_dict("records"),
+                max(1, -(-len(rows) // page_size)))
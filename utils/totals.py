@@ -0,0 +1,269 @@
+import json
+import logging
+import os
+
+import numpy as np
+import pandas as pd
+
+import utils.etl as etl
+
+logger = logging.getLogger(__name__)
+
+# Counts of values of a column, next to its sums in daily_sums
+COUNT = "{} n"
+
+
+def daily_sums(frame, columns):
+    """Sums and numbers of values of columns, by day and player
+    
+    Arguments:
+        frame {DataFrame} -- dataset, with Nom and Date columns
+        columns {list} -- columns summed
+    
+    Returns:
+        [DataFrame] -- Date, Nom, the sums of each column, and their counts
+                       named after COUNT
+    """
+    frame = frame[frame.Date.notna() & frame.Nom.notna()]
+    values = frame[list(columns)].astype(float)
+    keys = [
+        pd.to_datetime(frame.Date).dt.normalize().rename("Date"),
+        frame.Nom.astype(str).rename("Nom")
+    ]
+
+    sums = values.groupby(keys).sum()
+    counts = values.notna().groupby(keys).sum().rename(columns=COUNT.format)
+    return pd.concat([sums, counts], axis=1).reset_index()
+
+
+class RangeTotals:
+    """Sums of columns over any date range, per player and per group
+    
+    The rows are summed by player and day over a daily grid, and the daily
+    sums accumulated once. The sum over a range is then the difference of
+    two rows of the cumulative sums, whatever its length. The groups, e.g.
+    positions, get their own cumulative sums the same way. Missing values
+    count as 0 in the sums, and are left out of the counts.
+    
+    Arguments:
+        frame {DataFrame} -- dataset, with Nom and Date columns
+        columns {list} -- columns summed
+    
+    Keyword Arguments:
+        groups {Series} -- group of each player, e.g. its position
+                           (default: {None})
+    """
+
+    def __init__(self, frame, columns, groups=None):
+        self._build(daily_sums(frame, columns), columns, groups)
+
+    @classmethod
+    def from_daily(cls, daily, columns, groups=None):
+        """Totals of daily sums already computed, see daily_sums
+        
+        Arguments:
+            daily {DataFrame} -- daily sums
+            columns {list} -- columns summed
+        
+        Keyword Arguments:
+            groups {Series} -- group of each player (default: {None})
+        
+        Returns:
+            [RangeTotals] -- totals
+        """
+        totals = cls.__new__(cls)
+        totals._build(daily, columns, groups)
+        return totals
+
+    def _build(self, daily, columns, groups):
+        self.columns = list(columns)
+
+        daily = daily.groupby(["Date", "Nom"]).sum()
+        if len(daily):
+            days = daily.index.get_level_values(0)
+            self.days = pd.date_range(days.min(), days.max(), freq="D")
+        else:
+            self.days = pd.DatetimeIndex([])
+        self.players = pd.Index(sorted(
+            daily.index.get_level_values(1).unique()))
+
+        self._sums = self._accumulate(daily[self.columns])
+        self._counts = self._accumulate(
+            daily[[COUNT.format(col) for col in self.columns]])
+
+        self.groups = pd.Index([])
+        self._members = np.zeros((len(self.players), 0))
+        self._group_sums = self._group_counts = None
+        if groups is not None:
+            groups = groups[~groups.index.duplicated()].reindex(self.players)
+            self.groups = pd.Index(sorted(groups.dropna().unique()))
+            # players by group, as a boolean matrix
+            self._members = (groups.values[:, None] == self.groups.values)
+            self._group_sums = np.einsum("dpc,pg->dgc", self._sums,
+                                         self._members)
+            self._group_counts = np.einsum("dpc,pg->dgc", self._counts,
+                                           self._members)
+
+    def _accumulate(self, daily):
+        """Cumulative sums over the grid, with a row of zeros first"""
+        grid = np.zeros(
+            (len(self.days) + 1, len(self.players), len(self.columns)))
+        if len(daily):
+            day = self.days.get_indexer(daily.index.get_level_values(0))
+            player = self.players.get_indexer(daily.index.get_level_values(1))
+            grid[day + 1, player] = daily.values
+        return grid.cumsum(axis=0)
+
+    def _bounds(self, start, end):
+        """Rows of the cumulative sums bounding the days from start to end"""
+        start = self.days.searchsorted(pd.Timestamp(start), side="left")
+        end = self.days.searchsorted(pd.Timestamp(end), side="right")
+        return start, max(start, end)
+
+    def _range(self, cumulative, index, start, end):
+        start, end = self._bounds(start, end)
+        return pd.DataFrame(cumulative[end] - cumulative[start],
+                            index=index,
+                            columns=self.columns)
+
+    def sums(self, start, end):
+        """Sums of each player from start to end, both included
+        
+        Arguments:
+            start -- first day
+            end -- last day
+        
+        Returns:
+            [DataFrame] -- sums, one row per player
+        """
+        return self._range(self._sums, self.players, start, end)
+
+    def counts(self, start, end):
+        """Number of values of each player from start to end"""
+        return self._range(self._counts, self.players, start, end)
+
+    def means(self, start, end):
+        """Means of each player from start to end, NaN without values"""
+        return self.sums(start, end) / self.counts(start, end).replace(
+            0, np.nan)
+
+    def group_sums(self, start, end):
+        """Sums of each group from start to end, see sums"""
+        return self._range(self._group_sums, self.groups, start, end)
+
+    def group_players(self, start, end):
+        """Number of players of each group with values from start to end"""
+        active = self.counts(start, end).sum(axis=1) > 0
+        members = self._members[active.values].sum(axis=0)
+        return pd.Series(members, index=self.groups)
+
+    def group_means(self, start, end):
+        """Means of each group from start to end, see means"""
+        counts = self._range(self._group_counts, self.groups, start, end)
+        return self.group_sums(start, end) / counts.replace(0, np.nan)
+
+
+class DailySums:
+    """Daily sums of a dataset, kept per month next to its ingest cache
+    
+    The sums of a month are computed from its partition once, and stored
+    with the size and modification time of the partition. They are only
+    computed again for the partitions rewritten since, as reported by
+    etl.load_cached, so the totals over the whole history are built without
+    reading it. The sums read are kept in memory between updates.
+    
+    Arguments:
+        path {Pathlib path} -- main data directory
+        name {str} -- dataset, e.g. Seances
+        columns {list} -- columns summed
+    """
+
+    def __init__(self, path, name, columns):
+        self.path = path
+        self.name = name
+        self.columns = list(columns)
+        self.folder = path / etl.CACHE_FOLDER / "{}.totals".format(name)
+        self._months = {}
+
+    def _stamp(self, month):
+        stat = etl.partition(self.path, self.name, month).stat()
+        return [stat.st_size, stat.st_mtime_ns]
+
+    def _file(self, month):
+        return self.folder / "{}.parquet".format(month)
+
+    def _write(self, f, write):
+        tmp = f.with_name("{}.{}.tmp".format(f.name, os.getpid()))
+        write(tmp)
+        os.replace(str(tmp), str(f))
+
+    def update(self, changed, available):
+        """Bring the sums up to date with the partitions, see the on_update
+        of etl.load_cached, under the lock of which it runs
+        
+        Arguments:
+            changed {list} -- months of the partitions rewritten or removed
+            available {list} -- every month of the dataset
+        """
+        index_file = self.folder / "index.json"
+        try:
+            index = json.loads(index_file.read_text())
+        except (OSError, ValueError):
+            index = {}
+        stamps = dict(index.get("months", {}))
+        if index.get("columns") != self.columns:
+            stamps = {}
+
+        self.folder.mkdir(parents=True, exist_ok=True)
+        months, computed = {}, []
+        for month in available:
+            stamp = self._stamp(month)
+            kept, sums = self._months.get(month, (None, None)), None
+            if month not in changed and kept[0] == stamp:
+                sums = kept[1]
+            elif month not in changed and stamps.get(month) == stamp:
+                try:
+                    sums = pd.read_parquet(self._file(month))
+                except (OSError, ValueError):
+                    sums = None
+            if sums is None:
+                rows = etl.read_partition(self.path, self.name, month,
+                                          ["Nom", "Date"] + self.columns)
+                sums = daily_sums(rows, self.columns)
+                self._write(self._file(month),
+                            lambda tmp: sums.to_parquet(tmp, index=False))
+                stamps[month] = stamp
+                computed.append(month)
+            months[month] = (stamp, sums)
+
+        for month in set(stamps) - set(available):
+            del stamps[month]
+            if self._file(month).exists():
+                self._file(month).unlink()
+        self._months = months
+
+        if computed or index.get("months") != stamps:
+            self._write(
+                index_file, lambda tmp: tmp.write_text(
+                    json.dumps(dict(columns=self.columns, months=stamps))))
+        if computed:
+            logger.info("%s: daily sums of %d month(s) computed", self.name,
+                        len(computed))
+
+    def totals(self, groups=None):
+        """Totals over every month, see RangeTotals
+        
+        Keyword Arguments:
+            groups {Series} -- group of each player (default: {None})
+        
+        Returns:
+            [RangeTotals] -- totals
+        """
+        daily = [sums for stamp, sums in self._months.values()]
+        if not daily:
+            daily = [
+                daily_sums(pd.DataFrame(columns=["Nom", "Date"] + self.columns),
+                           self.columns)
+            ]
+        return RangeTotals.from_daily(pd.concat(daily, ignore_index=True),
+                                      self.columns, groups)